@@ -1,20 +1,79 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify
+from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, Response, stream_with_context, send_file, send_from_directory
 from flask_sqlalchemy import SQLAlchemy
+from alembic.config import Config as AlembicConfig
+from alembic.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy.exc import IntegrityError
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, date, timedelta
 import os
 import json
+import hashlib
+import hmac
+import socket
 from functools import wraps
+import click
+from streaming_export import EXPORT_FORMATS, iter_export
+from pdf_documents import page_resources, render_invoice, render_batch
+from image_uploads import InvalidImage, store_photo, sweep_photos, thumbnail_name
+from static_assets import IMMUTABLE_MAX_AGE, build_manifest, pick_encoding
+from item_search import ItemSearch
+from fts_search import create_search_index, match_expression, matching_ids_sql, ranked_ids_sql
+from cart_store import CART_MAX_AGE, DatabaseCartStore, MemoryCartStore
+from query_audit import init_query_audit, query_budget
+from request_metrics import init_request_metrics, metrics_text
+from request_profiler import PROFILE_NAME, init_request_profiler, list_profiles, stats_text
+from db_engine import engine_options, init_sqlite_tuning
 from werkzeug.utils import secure_filename
 import uuid
+import threading
+import re
+import mimetypes
+import logging
+import random
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your-secret-key-here'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///stock_sale.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///stock_sale.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Engine tuning, see db_engine
+app.config['DB_POOL_SIZE'] = int(os.environ.get('DB_POOL_SIZE', 5))
+app.config['DB_MAX_OVERFLOW'] = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+# SQLite runs one writer at a time, so a file database gets a smaller pool:
+# at most 2 + 3 connections, each with its own page cache (5 x 16 MiB = 80 MiB
+# per process at worst; the mmap window is shared page cache on top)
+app.config['SQLITE_POOL_SIZE'] = int(os.environ.get('SQLITE_POOL_SIZE', 2))
+app.config['SQLITE_MAX_OVERFLOW'] = int(os.environ.get('SQLITE_MAX_OVERFLOW', 3))
+app.config['SQLITE_TUNING'] = os.environ.get('SQLITE_TUNING', '1') == '1'
+app.config['SQLITE_JOURNAL_MODE'] = 'WAL'
+app.config['SQLITE_SYNCHRONOUS'] = 'NORMAL'  # durable across app crashes; a power cut may lose the last commits
+app.config['SQLITE_BUSY_TIMEOUT_MS'] = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+app.config['SQLITE_CACHE_SIZE_KB'] = 16 * 1024  # per connection
+app.config['SQLITE_MMAP_SIZE'] = 256 * 1024 * 1024
+app.config['SQLITE_FOREIGN_KEYS'] = True
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'], app.config)
 app.config['UPLOAD_FOLDER'] = 'static/uploads'  # Add this line
+app.config['SHOP_NAME'] = os.environ.get('SHOP_NAME', 'Sales & Stock Management System')
+app.config['INVOICE_FONT'] = os.environ.get('INVOICE_FONT')  # TTF with the rupee sign, optional
+app.config['INVOICE_CACHE_MAX_FILES'] = 500
+app.config['INVOICE_CACHE_MAX_BYTES'] = 200 * 1024 * 1024
+app.config['BATCH_PDF_WORKERS'] = int(os.environ.get('BATCH_PDF_WORKERS', 0)) or None  # None = one per CPU
+app.config['CART_STORE'] = os.environ.get('CART_STORE', 'database')  # or 'memory' (single process, tests)
+app.config['SQL_AUDIT'] = os.environ.get('SQL_AUDIT') == '1'  # count queries per request, log N+1 patterns
+app.config['SQL_QUERY_BUDGET'] = int(os.environ.get('SQL_QUERY_BUDGET', 0)) or None
+app.config['SQL_AUDIT_RAISE'] = os.environ.get('SQL_AUDIT_RAISE') == '1'  # fail requests over budget (tests)
+app.config['REQUEST_METRICS'] = os.environ.get('REQUEST_METRICS', '1') == '1'  # /metrics and access log
+app.config['ACCESS_LOG'] = os.environ.get('ACCESS_LOG', '1') == '1'  # one JSON line per request on stderr
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')  # bearer token for /metrics; unset = admins only
+app.config['DEBUG_LOG_SAMPLE_RATE'] = float(os.environ.get('DEBUG_LOG_SAMPLE_RATE', 0.01))
+app.config['PROFILING'] = os.environ.get('PROFILING', '1') == '1'  # admins may add ?_profile=1 to a URL
+app.config['PROFILE_MAX_FILES'] = 50
+app.config['PROFILE_MAX_BYTES'] = 50 * 1024 * 1024
 
 db = SQLAlchemy(app)
+init_sqlite_tuning(app, db)
+init_query_audit(app, db)
+init_request_metrics(app, db)
 
 # Ensure upload folder exists
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
@@ -25,6 +84,68 @@ def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def store_customer_photo(stream):
+    # Re-encode the upload once (EXIF stripped) as a full-size JPEG plus
+    # thumbnails, named by content hash; returns the photo_path to store on
+    # the customer. Unreferenced files are removed by `flask sweep-uploads`.
+    filename = store_photo(stream, app.config['UPLOAD_FOLDER'])
+    return f"uploads/{filename}"
+
+@app.context_processor
+def photo_helpers():
+    def customer_photo(photo_path, size='sm'):
+        # WebP and JPEG thumbnail URLs for a <picture>; photos uploaded before
+        # thumbnails existed fall back to the original file
+        if not photo_path:
+            return {'webp': None, 'jpg': url_for('static', filename='images/default-user.png')}
+        webp = thumbnail_name(photo_path, size, 'webp')
+        if not os.path.exists(os.path.join(app.static_folder, webp)):
+            return {'webp': None, 'jpg': url_for('static', filename=photo_path)}
+        return {
+            'webp': url_for('static', filename=webp),
+            'jpg': url_for('static', filename=thumbnail_name(photo_path, size, 'jpg'))
+        }
+    return {'customer_photo': customer_photo}
+
+# Static files: url_for('static', ...) links to a content-fingerprinted name
+# that is cached for a year. Built at startup; restart to pick up edits.
+STATIC_MANIFEST = build_manifest(app.static_folder, os.path.join(app.instance_path, 'static_cache'))
+
+# Content-addressed photos (see image_uploads) never change either
+HASHED_UPLOAD = re.compile(r'^uploads/[0-9a-f]{2}/[0-9a-f]{64}(_\w+)?\.(jpg|webp)$')
+
+@app.url_defaults
+def fingerprint_static_url(endpoint, values):
+    if endpoint == 'static' and values.get('filename') in STATIC_MANIFEST.urls:
+        values['filename'] = STATIC_MANIFEST.urls[values['filename']]
+
+def static_file(filename):
+    entry = STATIC_MANIFEST.files.get(filename)
+    if entry is None:
+        response = app.send_static_file(filename)
+        if HASHED_UPLOAD.match(filename):
+            response.cache_control.max_age = IMMUTABLE_MAX_AGE
+            response.cache_control.immutable = True
+        return response
+    
+    logical, encodings = entry
+    encoding = pick_encoding(request.accept_encodings, encodings)
+    if encoding:
+        response = send_file(encodings[encoding],
+                             mimetype=mimetypes.guess_type(logical)[0] or 'application/octet-stream')
+        response.headers['Content-Encoding'] = encoding
+    else:
+        response = send_from_directory(app.static_folder, logical)
+    if encodings:
+        response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.max_age = IMMUTABLE_MAX_AGE
+    response.cache_control.immutable = True
+    response.cache_control.no_cache = None
+    return response
+
+app.view_functions['static'] = static_file
+
 # Models
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -41,6 +162,13 @@ class Item(db.Model):
     sale_price = db.Column(db.Float, nullable=False)
     date_added = db.Column(db.Date, default=date.today())
     supplier_id = db.Column(db.Integer, db.ForeignKey('supplier.id'))
+    
+    # Indexes (see migrations/versions for existing databases)
+    __table_args__ = (
+        db.Index('ix_item_name', 'name'),
+        db.Index('ix_item_quantity', 'quantity'),
+        db.Index('ix_item_supplier_id', 'supplier_id'),
+    )
 
 class Customer(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -50,6 +178,14 @@ class Customer(db.Model):
     aadhar = db.Column(db.String(20))
     date_added = db.Column(db.Date, default=date.today())
     photo_path = db.Column(db.String(200))
+    # Sum of sale dues minus payments, kept up to date by the sale and
+    # payment routes (see adjust_customer_balance / rebuild-balances)
+    balance = db.Column(db.Float, default=0.0, server_default='0')
+    
+    __table_args__ = (
+        db.Index('ix_customer_name', 'name'),
+        db.Index('ix_customer_date_added', 'date_added'),
+    )
 
 
 class Supplier(db.Model):
@@ -78,6 +214,10 @@ class SupplierTransaction(db.Model):
     transaction_type = db.Column(db.String(20), nullable=False)  # 'purchase' or 'payment'
     created_at = db.Column(db.DateTime, default=datetime.now())
     
+    __table_args__ = (
+        db.Index('ix_supplier_transaction_supplier_date', 'supplier_id', 'date', 'id'),
+    )
+    
     def __repr__(self):
         return f"<SupplierTransaction {self.id} - {self.transaction_type} - {self.amount}>"
 
@@ -95,6 +235,13 @@ class Sale(db.Model):
     cash_amount = db.Column(db.Float, default=0.0)
     online_amount = db.Column(db.Float, default=0.0)
     created_at = db.Column(db.DateTime, default=datetime.now())
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+    
+    __table_args__ = (
+        db.Index('uq_sale_bill_number', 'bill_number', unique=True),
+        db.Index('ix_sale_sale_date', 'sale_date', 'id'),
+        db.Index('ix_sale_customer_date', 'customer_id', 'sale_date'),
+    )
     
     # Relationships
     customer = db.relationship('Customer', backref='sales')
@@ -115,10 +262,20 @@ class SaleItem(db.Model):
     sale_price = db.Column(db.Float, nullable=False)
     profit = db.Column(db.Float, nullable=False)
     
+    __table_args__ = (
+        db.Index('ix_sale_item_sale_id', 'sale_id'),
+        db.Index('ix_sale_item_item_id', 'item_id'),
+    )
+    
     # Relationships
     sale = db.relationship('Sale', back_populates='items')
     item = db.relationship('Item', backref='sale_items')
 
+class BillSequence(db.Model):
+    # Last bill number handed out for each day (YYYYMMDD), see next_bill_number()
+    day = db.Column(db.String(8), primary_key=True)
+    last_value = db.Column(db.Integer, nullable=False, default=0)
+
 class Payment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     customer_id = db.Column(db.Integer, db.ForeignKey('customer.id'), nullable=False)
@@ -126,10 +283,47 @@ class Payment(db.Model):
     payment_date = db.Column(db.Date, nullable=False)
     description = db.Column(db.String(200))
     created_at = db.Column(db.DateTime, default=datetime.now())
+    
+    __table_args__ = (
+        db.Index('ix_payment_customer_date', 'customer_id', 'payment_date'),
+    )
 
-# Create tables
-with app.app_context():
-    db.create_all()
+class DailySalesSummary(db.Model):
+    # Per-day rollup of Sale, maintained by the sale routes (see
+    # adjust_daily_summary / rebuild-daily-summary)
+    __tablename__ = 'daily_sales_summary'
+    sale_date = db.Column(db.Date, primary_key=True)
+    bill_count = db.Column(db.Integer, nullable=False, default=0)
+    total_amount = db.Column(db.Float, nullable=False, default=0.0)
+    received_amount = db.Column(db.Float, nullable=False, default=0.0)
+    due_amount = db.Column(db.Float, nullable=False, default=0.0)
+    total_profit = db.Column(db.Float, nullable=False, default=0.0)
+    cash_amount = db.Column(db.Float, nullable=False, default=0.0)
+    online_amount = db.Column(db.Float, nullable=False, default=0.0)
+
+class Cart(db.Model):
+    # In-progress sale cart, keyed by the id in session['cart_id'];
+    # subtotal and line_count are kept up to date by DatabaseCartStore
+    id = db.Column(db.String(32), primary_key=True)
+    subtotal = db.Column(db.Float, nullable=False, default=0.0)
+    line_count = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, index=True)
+
+class CartLine(db.Model):
+    __tablename__ = 'cart_line'
+    cart_id = db.Column(db.String(32), db.ForeignKey('cart.id'), primary_key=True)
+    item_id = db.Column(db.Integer, primary_key=True)  # no FK: a cart must not block deleting an item
+    name = db.Column(db.String(100), nullable=False)
+    quantity = db.Column(db.Float, nullable=False)
+    unit = db.Column(db.String(20), nullable=False)
+    purchase_price = db.Column(db.Float, nullable=False)
+    sale_price = db.Column(db.Float, nullable=False)
+    added_at = db.Column(db.DateTime, nullable=False)
+
+if app.config['CART_STORE'] == 'memory':
+    cart_store = MemoryCartStore()
+else:
+    cart_store = DatabaseCartStore(db, Cart, CartLine)
 
 # Login required decorator
 def login_required(f):
@@ -141,7 +335,39 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def admin_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if 'user_id' not in session:
+            flash('Please log in to access this page.', 'danger')
+            return redirect(url_for('login'))
+        if session.get('role') != 'admin':
+            return jsonify({'success': False, 'message': 'Admin access required'}), 403
+        return f(*args, **kwargs)
+    return decorated_function
+
+def log_sampled_debug(message, *args):
+    # Debug detail for a fraction (DEBUG_LOG_SAMPLE_RATE) of hits, so busy
+    # views don't flood the log when debug logging is on
+    if app.logger.isEnabledFor(logging.DEBUG) and random.random() < app.config['DEBUG_LOG_SAMPLE_RATE']:
+        app.logger.debug(message, *args)
+
 # Routes
+@app.route('/metrics')
+def metrics():
+    # Prometheus scrape endpoint (see request_metrics). Scrapers send the
+    # METRICS_TOKEN bearer token; without one configured only a logged-in
+    # admin can read it and everyone else gets a 404.
+    if not app.config['REQUEST_METRICS']:
+        return Response('Not Found\n', status=404, mimetype='text/plain')
+    token = app.config['METRICS_TOKEN']
+    if session.get('role') != 'admin':
+        if not token:
+            return Response('Not Found\n', status=404, mimetype='text/plain')
+        if not hmac.compare_digest(request.headers.get('Authorization', '').encode(), f'Bearer {token}'.encode()):
+            return Response('Unauthorized\n', status=401, mimetype='text/plain')
+    return Response(metrics_text(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/')
 @login_required
 def index():
@@ -186,38 +412,37 @@ def create_admin_user():
             db.session.commit()
             print("Admin user created!")
 
-# Initialize database and admin user
-with app.app_context():
-    db.create_all()  # Create tables
-    create_admin_user()  # Add admin user
-
 # --- Your Routes Here ---
 @app.route('/')
 def home():
     return "Hello World!"
 
 
+LOW_STOCK_THRESHOLD = 2
+
 @app.route('/dashboard')
 @login_required
+@query_budget(6)
 def dashboard():
     # Today's summary
     today = date.today()
     
-    # Total sales today
-    sales_today = Sale.query.filter_by(sale_date=today).all()
-    total_sales = sum(sale.total_amount for sale in sales_today)
-    total_received = sum(sale.received_amount for sale in sales_today)
-    total_due = sum(sale.due_amount for sale in sales_today)
-    total_profit = sum(sale.total_profit for sale in sales_today)
+    # Total sales today, from the daily rollup row
+    summary = daily_summary_totals(today, today)
+    total_sales = summary['total_amount']
+    total_received = summary['received_amount']
+    total_due = summary['due_amount']
+    total_profit = summary['total_profit']
     
     # New customers today
     new_customers = Customer.query.filter_by(date_added=today).count()
     
-    # Low stock items
-    low_stock_items = Item.query.filter(Item.quantity < 2).order_by(Item.quantity).all()
+    # Low stock items (range scan on ix_item_quantity)
+    low_stock_items = Item.query.filter(Item.quantity < LOW_STOCK_THRESHOLD).order_by(Item.quantity).all()
     
-    # Recent sales
-    recent_sales = Sale.query.order_by(Sale.sale_date.desc(), Sale.id.desc()).limit(10).all()
+    # Recent sales with their customers in the same query
+    recent_sales = Sale.query.options(db.joinedload(Sale.customer))\
+        .order_by(Sale.sale_date.desc(), Sale.id.desc()).limit(10).all()
     
     return render_template('dashboard.html', 
                          total_sales=total_sales,
@@ -229,17 +454,147 @@ def dashboard():
                          recent_sales=recent_sales)
 
 # Items Management
-@app.route('/items')
+# Item typeahead: an in-process name index (see item_search). Each worker
+# rebuilds its copy on the next search after mark_items_changed().
+ITEM_INDEX_VERSION_FILE = os.path.join(app.instance_path, 'item_index.version')
+ITEM_SEARCH_LIMIT = 20
+
+def item_index_version():
+    try:
+        stat = os.stat(ITEM_INDEX_VERSION_FILE)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns
+
+def mark_items_changed():
+    # Replaced rather than rewritten, so the inode changes even when two
+    # edits land within the same mtime tick
+    os.makedirs(app.instance_path, exist_ok=True)
+    tmp_path = f'{ITEM_INDEX_VERSION_FILE}.{uuid.uuid4().hex}.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(datetime.now().isoformat())
+    os.replace(tmp_path, ITEM_INDEX_VERSION_FILE)
+
+item_search = ItemSearch(
+    lambda: db.session.query(Item.id, Item.name).all(),
+    item_index_version
+)
+
+@app.route('/api/items/search')
 @login_required
-def items():
-    search_term = request.args.get('search', '')
+def api_search_items():
+    query = request.args.get('q', '')
+    limit = min(max(request.args.get('limit', ITEM_SEARCH_LIMIT, type=int), 1), 100)
+    in_stock = request.args.get('in_stock', '1') != '0'
+    
+    # Ranked ids come from the index; stock and prices from the database,
+    # a batch at a time until enough in-stock items are found. The first
+    # batch usually suffices, so only that much is ranked up front; the full
+    # ranking is taken only when it turns out to be mostly out of stock.
+    batch_size = limit * 2
+    ids = item_search.search(query, limit=batch_size)
+    ranked_all = len(ids) < batch_size
+    results = []
+    start = 0
+    while True:
+        if start + batch_size > len(ids) and not ranked_all:
+            ids = item_search.search(query, limit=None)
+            ranked_all = True
+        batch = ids[start:start + batch_size]
+        if not batch:
+            break
+        start += batch_size
+        rows = db.session.execute(db.select(
+            Item.id, Item.name, Item.quantity, Item.unit, Item.sale_price, Item.purchase_price
+        ).where(Item.id.in_(batch))).all()
+        found = {row.id: row for row in rows}
+        for item_id in batch:
+            row = found.get(item_id)
+            if row is None or (in_stock and row.quantity <= 0):
+                continue
+            results.append({
+                'id': row.id,
+                'name': row.name,
+                'quantity': row.quantity,
+                'unit': row.unit,
+                'sale_price': row.sale_price,
+                'purchase_price': row.purchase_price
+            })
+            if len(results) == limit:
+                return jsonify({'success': True, 'items': results})
+    
+    return jsonify({'success': True, 'items': results})
+
+ITEMS_PAGE_SIZE = 100
+
+def parse_item_cursor(cursor):
+    # Item cursors are an id when browsing, or a position in the ranked
+    # results when searching (the ranking lives in item_search, not in SQL)
+    try:
+        return int(cursor) if cursor else None
+    except ValueError:
+        return None
+
+def items_listing(args, limit=ITEMS_PAGE_SIZE):
+    # One page of /items. `after` moves forward and `before` back; returns
+    # (search_term, items, next_cursor, prev_cursor)
+    search_term = args.get('search', '')
+    before = parse_item_cursor(args.get('before'))
+    after = parse_item_cursor(args.get('after'))
     
     if search_term:
-        items = Item.query.filter(Item.name.ilike(f'%{search_term}%')).order_by(Item.name).all()
+        if before is not None:
+            start, end = max(before - limit, 0), max(before, 0)
+        else:
+            start = max(after or 0, 0)
+            end = start + limit
+        ids = item_search.search(search_term, limit=end + 1)
+        page_ids = ids[start:end]
+        order = {item_id: position for position, item_id in enumerate(page_ids)}
+        items = sorted(Item.query.filter(Item.id.in_(page_ids)).all(), key=lambda item: order[item.id])
+        next_cursor = str(end) if len(ids) > end else None
+        prev_cursor = str(start) if start > 0 else None
+        return search_term, items, next_cursor, prev_cursor
+    
+    if before is not None:
+        rows = Item.query.filter(Item.id < before).order_by(Item.id.desc()).limit(limit + 1).all()
+        has_prev, has_next = len(rows) > limit, True
+        items = rows[:limit][::-1]
     else:
-        items = Item.query.order_by(Item.id).all()
-    
-    return render_template('items.html', items=items, search_term=search_term)
+        query = Item.query.filter(Item.id > after) if after is not None else Item.query
+        rows = query.order_by(Item.id).limit(limit + 1).all()
+        has_prev, has_next = after is not None, len(rows) > limit
+        items = rows[:limit]
+    next_cursor = str(items[-1].id) if items and has_next else None
+    prev_cursor = str(items[0].id) if items and has_prev else None
+    return search_term, items, next_cursor, prev_cursor
+
+@app.route('/items')
+@login_required
+@query_budget(3)
+def items():
+    search_term, items, next_cursor, prev_cursor = items_listing(request.args)
+    return render_template('items.html', items=items, search_term=search_term,
+                           next_cursor=next_cursor, prev_cursor=prev_cursor)
+
+@app.route('/api/items')
+@login_required
+def items_json():
+    limit = max(min(request.args.get('limit', ITEMS_PAGE_SIZE, type=int), 500), 1)
+    search_term, items, next_cursor, prev_cursor = items_listing(request.args, limit)
+    return jsonify({
+        'success': True,
+        'items': [{
+            'id': item.id,
+            'name': item.name,
+            'quantity': item.quantity,
+            'unit': item.unit,
+            'purchase_price': item.purchase_price,
+            'sale_price': item.sale_price
+        } for item in items],
+        'next_cursor': next_cursor,
+        'prev_cursor': prev_cursor
+    })
 
 @app.route('/items/add', methods=['GET', 'POST'])
 @login_required
@@ -266,6 +621,7 @@ def add_item():
             )
             db.session.add(new_item)
             db.session.commit()
+            mark_items_changed()
             
             flash('Item added successfully', 'success')
             return redirect(url_for('items'))
@@ -289,6 +645,7 @@ def edit_item(id):
         
         try:
             db.session.commit()
+            mark_items_changed()
             flash('Item updated successfully', 'success')
             return redirect(url_for('items'))
         except Exception as e:
@@ -311,6 +668,7 @@ def delete_item(id):
     try:
         db.session.delete(item)
         db.session.commit()
+        mark_items_changed()
         flash('Item deleted successfully', 'success')
     except Exception as e:
         db.session.rollback()
@@ -319,17 +677,91 @@ def delete_item(id):
     return redirect(url_for('items'))
 
 # Sales Management
+def decrement_stock(quantities):
+    # Take {item_id: quantity} out of stock with conditional UPDATEs, so two
+    # tills can't both sell the last units. Returns the id of the first item
+    # without enough stock (caller must roll back), or None on success.
+    for item_id, quantity in quantities.items():
+        result = db.session.execute(
+            db.update(Item)
+            .where(Item.id == item_id, Item.quantity >= quantity)
+            .values(quantity=Item.quantity - quantity)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount != 1:
+            return item_id
+    return None
+
+def next_bill_number(day):
+    # Allocate the next YYYYMMDD-NNNN number from the per-day counter. The
+    # UPDATE takes the write lock, so concurrent checkouts are serialized and
+    # the number is committed (or rolled back) together with the sale.
+    key = day.strftime("%Y%m%d")
+    value = db.session.execute(
+        db.update(BillSequence)
+        .where(BillSequence.day == key)
+        .values(last_value=BillSequence.last_value + 1)
+        .returning(BillSequence.last_value)
+    ).scalar()
+    
+    if value is None:
+        # First bill of the day: continue after any bills raised before the
+        # counter existed
+        last_bill = db.session.query(db.func.max(Sale.bill_number))\
+            .filter(Sale.bill_number.like(f"{key}-%")).scalar()
+        value = int(last_bill.rsplit('-', 1)[1]) + 1 if last_bill else 1
+        try:
+            with db.session.begin_nested():
+                db.session.add(BillSequence(day=key, last_value=value))
+        except IntegrityError:
+            # Another worker created the counter first
+            return next_bill_number(day)
+    
+    return f"{key}-{value:04d}"
+
+SALES_PAGE_SIZE = 50
+
+def sales_listing(args, limit=SALES_PAGE_SIZE):
+    # One keyset page of /sales (optionally a bill-number search), from the
+    # before/after cursors in args
+    search_term = args.get('search', '')
+    query = Sale.query.options(db.joinedload(Sale.customer))
+    if search_term:
+        query = query.filter(Sale.bill_number.ilike(f'%{search_term}%'))
+    sales, next_cursor, prev_cursor = sales_page(
+        query, parse_sale_cursor(args.get('before')), limit, after=parse_sale_cursor(args.get('after'))
+    )
+    return search_term, sales, next_cursor, prev_cursor
+
 @app.route('/sales')
 @login_required
+@query_budget(3)
 def sales():
-    search_term = request.args.get('search', '')
-    
-    if search_term:
-        sales = Sale.query.filter(Sale.bill_number.ilike(f'%{search_term}%')).order_by(Sale.sale_date.desc()).all()
-    else:
-        sales = Sale.query.order_by(Sale.sale_date.desc(), Sale.id.desc()).limit(50).all()
-    
-    return render_template('sales.html', sales=sales, search_term=search_term)
+    search_term, sales, next_cursor, prev_cursor = sales_listing(request.args)
+    return render_template('sales.html', sales=sales, search_term=search_term,
+                           next_cursor=next_cursor, prev_cursor=prev_cursor)
+
+@app.route('/api/sales')
+@login_required
+def sales_json():
+    limit = max(min(request.args.get('limit', SALES_PAGE_SIZE, type=int), 500), 1)
+    search_term, sales, next_cursor, prev_cursor = sales_listing(request.args, limit)
+    return jsonify({
+        'success': True,
+        'sales': [{
+            'id': sale.id,
+            'bill_number': sale.bill_number,
+            'sale_date': sale.sale_date.isoformat(),
+            'customer_id': sale.customer_id,
+            'customer_name': sale.customer.name if sale.customer else None,
+            'total_amount': sale.total_amount,
+            'received_amount': sale.received_amount,
+            'due_amount': sale.due_amount,
+            'payment_method': sale.payment_method
+        } for sale in sales],
+        'next_cursor': next_cursor,
+        'prev_cursor': prev_cursor
+    })
 
 @app.route('/new_sale', methods=['GET', 'POST'])
 @login_required
@@ -361,9 +793,7 @@ def new_sale():
             due_amount = max(0, total_amount - received_amount)
             
             # Generate bill number
-            today = date.today().strftime("%Y%m%d")
-            count = Sale.query.filter(Sale.bill_number.like(f"{today}%")).count() + 1
-            bill_number = f"{today}-{count:04d}"
+            bill_number = next_bill_number(date.today())
             
             # Create sale record
             new_sale = Sale(
@@ -383,9 +813,19 @@ def new_sale():
             db.session.add(new_sale)
             db.session.flush()  # Get the sale ID
             
-            # Add sale items and update stock
+            # Load every cart item in one query
+            quantities = {}
+            for item_data in items:
+                quantities[item_data['item_id']] = quantities.get(item_data['item_id'], 0) + item_data['quantity']
+            db_items = {item.id: item for item in Item.query.filter(Item.id.in_(quantities.keys())).all()}
+            
+            missing = [item_id for item_id in quantities if item_id not in db_items]
+            if missing:
+                db.session.rollback()
+                return jsonify({'success': False, 'message': f'Item with ID {missing[0]} not found'}), 400
+            
+            # Add sale items
             for item_data in items:
-                # Add sale item
                 sale_item = SaleItem(
                     sale_id=new_sale.id,
                     item_id=item_data['item_id'],
@@ -396,21 +836,22 @@ def new_sale():
                     profit=(item_data['sale_price'] - item_data['purchase_price']) * item_data['quantity']
                 )
                 db.session.add(sale_item)
-                
-                # Update stock
-                db_item = Item.query.get(item_data['item_id'])
-                if not db_item:
-                    db.session.rollback()
-                    return jsonify({'success': False, 'message': f'Item with ID {item_data["item_id"]} not found'}), 400
-                
-                if db_item.quantity < item_data['quantity']:
-                    db.session.rollback()
-                    return jsonify({'success': False, 'message': f'Not enough stock for {db_item.name}'}), 400
-                
-                db_item.quantity -= item_data['quantity']
             
+            # Update stock; the whole sale is rejected if any line is short
+            short_item_id = decrement_stock(quantities)
+            if short_item_id is not None:
+                db.session.rollback()
+                return jsonify({'success': False, 'message': f'Not enough stock for {db_items[short_item_id].name}'}), 400
+            
+            adjust_customer_balance(new_sale.customer_id, due_amount)
+            adjust_daily_summary(new_sale.sale_date, sale_summary_values(new_sale))
             db.session.commit()
             
+            # The sale is saved; drop the server-side cart it was built from
+            cart_id = session.pop('cart_id', None)
+            if cart_id:
+                cart_store.clear(cart_id)
+            
             return jsonify({
                 'success': True,
                 'message': 'Sale completed successfully',
@@ -426,29 +867,124 @@ def new_sale():
                 'message': f'Failed to complete sale: {str(e)}'
             }), 500
 
-    # GET request - show form
-    items = Item.query.filter(Item.quantity > 0).order_by(Item.name).all()
-    customers = Customer.query.order_by(Customer.name).all()
-    return render_template('new_sale.html', 
-                         items=items, 
-                         customers=customers,
-                         cart=[])
+    # GET request - show form (items and customers are loaded by sales.js
+    # from /api/items/search and /api/customers/lookup)
+    return render_template('new_sale.html', cart=[])
 
 @app.route('/sales/<int:id>')
 @login_required
 def view_sale(id):
-    # Debugging: Print the sale items to console
     sale = Sale.query.options(
         db.joinedload(Sale.customer),
         db.joinedload(Sale.items).joinedload(SaleItem.item)
     ).get_or_404(id)
     
-    print("DEBUG - Sale Items:")  # Add this for debugging
-    for item in sale.items:
-        print(f"Item ID: {item.item_id}, Name: {item.item.name if item.item else 'None'}")
+    log_sampled_debug('Sale %s items: %s', sale.id, [
+        (item.item_id, item.item.name if item.item else None) for item in sale.items
+    ])
     
     return render_template('view_sale.html', sale=sale)
 
+# Invoice PDFs
+INVOICE_CACHE_DIR = os.path.join(app.instance_path, 'invoice_cache')
+
+def invoice_resource_args():
+    return (
+        app.config['SHOP_NAME'],
+        os.path.join(app.static_folder, 'images', 'fav.png'),
+        app.config['INVOICE_FONT']
+    )
+
+def invoice_resources():
+    # Per-process fonts, logo and static layout (cached in pdf_documents)
+    return page_resources(*invoice_resource_args())
+
+def sale_invoice_data(sale):
+    # Plain-data view of a sale for pdf_documents
+    return {
+        'bill_number': sale.bill_number,
+        'sale_date': sale.sale_date.strftime('%d-%m-%Y'),
+        'sale_time': sale.sale_time,
+        'customer': sale.customer.name if sale.customer else None,
+        'items': [(
+            sale_item.item.name if sale_item.item else f'Item #{sale_item.item_id}',
+            sale_item.quantity,
+            sale_item.unit,
+            sale_item.sale_price,
+            sale_item.quantity * sale_item.sale_price
+        ) for sale_item in sale.items],
+        'total': sale.total_amount,
+        'received': sale.received_amount,
+        'due': sale.due_amount,
+        'payment_method': sale.payment_method
+    }
+
+def invoice_cache_path(sale_id, invoice):
+    # Cache key: sale id + a hash of everything printed on the invoice, so an
+    # edited sale, a renamed customer or item, or a new shop name re-renders
+    printed = json.dumps([invoice, invoice_resource_args()], sort_keys=True, default=str)
+    digest = hashlib.sha256(printed.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(INVOICE_CACHE_DIR, f'{sale_id}-{digest}.pdf')
+
+def discard_cached_invoices(sale_id, keep=None):
+    if not os.path.isdir(INVOICE_CACHE_DIR):
+        return
+    prefix = f'{sale_id}-'
+    for name in os.listdir(INVOICE_CACHE_DIR):
+        path = os.path.join(INVOICE_CACHE_DIR, name)
+        if name.startswith(prefix) and path != keep:
+            try:
+                os.remove(path)
+            except OSError as e:
+                app.logger.error(f"Error deleting cached invoice: {str(e)}")
+
+def prune_invoice_cache():
+    # Keep the cache within its file count and size limits, dropping the
+    # least recently used files first
+    entries = []
+    for entry in os.scandir(INVOICE_CACHE_DIR):
+        if entry.is_file() and entry.name.endswith('.pdf'):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+    entries.sort()
+    
+    total_bytes = sum(size for _, size, _ in entries)
+    while entries and (len(entries) > app.config['INVOICE_CACHE_MAX_FILES'] or
+                       total_bytes > app.config['INVOICE_CACHE_MAX_BYTES']):
+        _, size, path = entries.pop(0)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        total_bytes -= size
+
+@app.route('/sales/<int:id>/invoice.pdf')
+@login_required
+def sale_invoice_pdf(id):
+    sale = Sale.query.options(
+        db.joinedload(Sale.customer),
+        db.selectinload(Sale.items).joinedload(SaleItem.item)
+    ).filter_by(id=id).first_or_404()
+    invoice = sale_invoice_data(sale)
+    path = invoice_cache_path(sale.id, invoice)
+    
+    if os.path.exists(path):
+        os.utime(path)  # Mark as recently used
+    else:
+        pdf_bytes = render_invoice(invoice, invoice_resources())
+        
+        # Write atomically so concurrent requests never serve a partial file
+        os.makedirs(INVOICE_CACHE_DIR, exist_ok=True)
+        tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(pdf_bytes)
+        os.replace(tmp_path, path)
+        discard_cached_invoices(sale.id, keep=path)
+        prune_invoice_cache()
+    
+    return send_file(path, mimetype='application/pdf',
+                     download_name=f'invoice_{sale.bill_number}.pdf')
+
 @app.route('/sales/<int:id>/edit')
 @login_required
 def edit_sale(id):
@@ -457,19 +993,14 @@ def edit_sale(id):
         db.joinedload(Sale.items).joinedload(SaleItem.item)
     ).get_or_404(id)
     
-    items = Item.query.filter(Item.quantity > 0).order_by(Item.name).all()
-    customers = Customer.query.order_by(Customer.name).all()
-    
     return render_template('edit_sale.html', 
                          sale=sale,
-                         items=items, 
-                         customers=customers,
                          max=max)  # Pass Python's built-in max function to the template
 
 @app.route('/sales/<int:id>/update', methods=['POST'])
 @login_required
 def update_sale(id):
-    sale = Sale.query.get_or_404(id)
+    sale = Sale.query.options(db.selectinload(Sale.items)).get_or_404(id)
     
     try:
         # Get JSON data from request
@@ -496,6 +1027,11 @@ def update_sale(id):
         total_profit = sum((item['sale_price'] - item['purchase_price']) * item['quantity'] for item in items)
         due_amount = max(0, total_amount - received_amount)
         
+        # Move the old due off the old customer and the new due onto the new one
+        adjust_customer_balance(sale.customer_id, -sale.due_amount)
+        adjust_customer_balance(customer_id if customer_id else None, due_amount)
+        old_summary = sale_summary_values(sale)
+        
         # Update sale record
         sale.customer_id = customer_id if customer_id else None
         sale.payment_method = payment_method
@@ -505,14 +1041,20 @@ def update_sale(id):
         sale.total_profit = total_profit
         sale.cash_amount = cash_amount if payment_method in ['Cash', 'Split'] else 0
         sale.online_amount = online_amount if payment_method in ['Online', 'Split'] else 0
+        sale.updated_at = datetime.now()  # Line item changes alone don't touch the row
         
         # Track which items to keep
         existing_item_ids = set()
         
+        # The sale's lines and every item involved, loaded once up front
+        sale_lines = {line.id: line for line in sale.items}
+        item_ids = {item_data['item_id'] for item_data in items} | {line.item_id for line in sale.items}
+        db_items = {item.id: item for item in Item.query.filter(Item.id.in_(item_ids)).all()}
+        
         # Process each item in the updated sale
         for item_data in items:
             if 'id' in item_data and item_data['id']:  # Existing sale item
-                sale_item = SaleItem.query.get(item_data['id'])
+                sale_item = sale_lines.get(item_data['id'])
                 if not sale_item:
                     continue
                 
@@ -525,7 +1067,7 @@ def update_sale(id):
                 sale_item.profit = (item_data['sale_price'] - item_data['purchase_price']) * item_data['quantity']
                 
                 # Update stock (add back original quantity, subtract new quantity)
-                db_item = Item.query.get(item_data['item_id'])
+                db_item = db_items.get(item_data['item_id'])
                 if not db_item:
                     db.session.rollback()
                     return jsonify({'success': False, 'message': f'Item with ID {item_data["item_id"]} not found'}), 400
@@ -547,7 +1089,7 @@ def update_sale(id):
                 db.session.add(sale_item)
                 
                 # Update stock
-                db_item = Item.query.get(item_data['item_id'])
+                db_item = db_items.get(item_data['item_id'])
                 if not db_item:
                     db.session.rollback()
                     return jsonify({'success': False, 'message': f'Item with ID {item_data["item_id"]} not found'}), 400
@@ -562,11 +1104,17 @@ def update_sale(id):
         for original_item in sale.items:
             if original_item.id not in existing_item_ids:
                 # Return stock for deleted items
-                db_item = Item.query.get(original_item.item_id)
+                db_item = db_items.get(original_item.item_id)
                 if db_item:
                     db_item.quantity += original_item.quantity
                 db.session.delete(original_item)
         
+        # Replace the old figures in the day's rollup with the new ones
+        new_summary = sale_summary_values(sale)
+        adjust_daily_summary(sale.sale_date, {
+            field: new_summary[field] - old_summary[field] for field in SUMMARY_FIELDS
+        })
+        
         db.session.commit()
         
         return jsonify({
@@ -588,40 +1136,276 @@ def update_sale(id):
 def delete_sale(id):
     sale = Sale.query.get_or_404(id)
     try:
+        adjust_customer_balance(sale.customer_id, -sale.due_amount)
+        adjust_daily_summary(sale.sale_date, sale_summary_values(sale, sign=-1))
         db.session.delete(sale)
         db.session.commit()
+        discard_cached_invoices(id)
         return jsonify({'success': True})
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'message': str(e)}), 500
 
 
+# Daily sales rollup
+SUMMARY_FIELDS = ('bill_count', 'total_amount', 'received_amount', 'due_amount',
+                  'total_profit', 'cash_amount', 'online_amount')
+
+def sale_summary_values(sale, sign=1):
+    # The sale's contribution to its day's DailySalesSummary row
+    values = {field: sign * (getattr(sale, field) or 0.0) for field in SUMMARY_FIELDS[1:]}
+    values['bill_count'] = sign
+    return values
+
+def adjust_daily_summary(sale_date, changes):
+    # Add `changes` ({field: delta}) to the rollup row for sale_date, creating
+    # it if needed; part of the caller's transaction
+    changes = {field: delta for field, delta in changes.items() if delta}
+    if not changes:
+        return
+    
+    result = db.session.execute(
+        db.update(DailySalesSummary)
+        .where(DailySalesSummary.sale_date == sale_date)
+        .values({getattr(DailySalesSummary, field): getattr(DailySalesSummary, field) + delta
+                 for field, delta in changes.items()})
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount:
+        if changes.get('bill_count', 0) < 0:
+            # A day whose last sale went away has no row, as after a rebuild
+            db.session.execute(
+                db.delete(DailySalesSummary)
+                .where(DailySalesSummary.sale_date == sale_date, DailySalesSummary.bill_count <= 0)
+                .execution_options(synchronize_session=False)
+            )
+        return
+    
+    try:
+        with db.session.begin_nested():
+            row = DailySalesSummary(sale_date=sale_date, **{field: 0 for field in SUMMARY_FIELDS})
+            for field, delta in changes.items():
+                setattr(row, field, delta)
+            db.session.add(row)
+    except IntegrityError:
+        # Another worker created the row first
+        adjust_daily_summary(sale_date, changes)
+
+def daily_summary_select():
+    # SELECT producing DailySalesSummary rows from the Sale table
+    return db.select(
+        Sale.sale_date,
+        db.func.count(Sale.id),
+        db.func.coalesce(db.func.sum(Sale.total_amount), 0.0),
+        db.func.coalesce(db.func.sum(Sale.received_amount), 0.0),
+        db.func.coalesce(db.func.sum(Sale.due_amount), 0.0),
+        db.func.coalesce(db.func.sum(Sale.total_profit), 0.0),
+        db.func.coalesce(db.func.sum(Sale.cash_amount), 0.0),
+        db.func.coalesce(db.func.sum(Sale.online_amount), 0.0)
+    ).group_by(Sale.sale_date)
+
+def rebuild_daily_summary(fix=True):
+    # Recompute the rollup from the sales. Returns the dates whose stored row
+    # was missing, stale or left over.
+    stored = {row.sale_date: row for row in DailySalesSummary.query.all()}
+    actual = {row[0]: row[1:] for row in db.session.execute(daily_summary_select())}
+    
+    # A missing row and an all-zero one both mean "no sales that day"
+    zeros = (0,) * len(SUMMARY_FIELDS)
+    drift = []
+    for sale_date in sorted(set(stored) | set(actual)):
+        row = stored.get(sale_date)
+        row_values = tuple(getattr(row, field) or 0 for field in SUMMARY_FIELDS) if row else zeros
+        values = actual.get(sale_date, zeros)
+        if any(abs(stored_value - value) > 0.01 for stored_value, value in zip(row_values, values)):
+            drift.append(sale_date)
+    
+    if fix:
+        DailySalesSummary.query.delete()
+        db.session.execute(
+            db.insert(DailySalesSummary).from_select(
+                ['sale_date'] + list(SUMMARY_FIELDS), daily_summary_select()
+            )
+        )
+        db.session.commit()
+    return drift
+
+@app.cli.command('rebuild-daily-summary')
+@click.option('--check', is_flag=True, help='Only report drift, do not write.')
+def rebuild_daily_summary_command(check):
+    """Backfill or verify the daily_sales_summary rollup."""
+    drift = rebuild_daily_summary(fix=not check)
+    for sale_date in drift:
+        click.echo(f'{sale_date.isoformat()}: rollup out of sync')
+    if check:
+        click.echo(f'{len(drift)} day(s) out of sync')
+    else:
+        click.echo(f'Rebuilt daily summary, {len(drift)} day(s) corrected')
+
+def daily_summary_totals(start_date, end_date):
+    # Summed rollup figures for an inclusive date range, as a dict
+    columns = [db.func.coalesce(db.func.sum(getattr(DailySalesSummary, field)), 0)
+               for field in SUMMARY_FIELDS]
+    row = db.session.query(*columns).filter(
+        DailySalesSummary.sale_date >= start_date,
+        DailySalesSummary.sale_date <= end_date
+    ).one()
+    return dict(zip(SUMMARY_FIELDS, row))
+
+
 # Customer Management
+def customer_balances_subquery():
+    # Per-customer balance (sale dues minus payments) as a grouped subquery
+    # with columns (customer_id, balance)
+    dues = db.session.query(
+        Sale.customer_id.label('customer_id'),
+        Sale.due_amount.label('amount')
+    ).filter(Sale.customer_id.isnot(None))
+    paid = db.session.query(
+        Payment.customer_id.label('customer_id'),
+        (-Payment.amount).label('amount')
+    )
+    entries = dues.union_all(paid).subquery()
+    return db.session.query(
+        entries.c.customer_id,
+        db.func.sum(entries.c.amount).label('balance')
+    ).group_by(entries.c.customer_id).subquery()
+
+def adjust_customer_balance(customer_id, delta):
+    # Apply delta to the stored balance in SQL so concurrent writers don't
+    # overwrite each other; part of the caller's transaction
+    if not customer_id or not delta:
+        return
+    Customer.query.filter_by(id=customer_id).update(
+        {Customer.balance: db.func.coalesce(Customer.balance, 0.0) + delta},
+        synchronize_session='fetch'
+    )
+
+def rebuild_customer_balances(fix=True):
+    # Recompute every balance from the sale and payment rows. Returns a list
+    # of (customer, stored, actual) for customers whose stored value drifted.
+    balances = customer_balances_subquery()
+    rows = db.session.query(
+        Customer,
+        db.func.coalesce(balances.c.balance, 0.0)
+    ).outerjoin(balances, balances.c.customer_id == Customer.id).all()
+    
+    drift = []
+    for customer, actual in rows:
+        stored = customer.balance or 0.0
+        if abs(stored - actual) > 0.01:
+            drift.append((customer, stored, actual))
+        if fix:
+            customer.balance = actual
+    
+    if fix:
+        db.session.commit()
+    return drift
+
+@app.cli.command('rebuild-balances')
+@click.option('--check', is_flag=True, help='Only report drift, do not write.')
+def rebuild_balances_command(check):
+    """Recompute stored customer balances from sales and payments."""
+    drift = rebuild_customer_balances(fix=not check)
+    for customer, stored, actual in drift:
+        click.echo(f'Customer {customer.id} ({customer.name}): stored {stored:.2f}, ledger {actual:.2f}')
+    if check:
+        click.echo(f'{len(drift)} customer balance(s) out of sync')
+    else:
+        click.echo(f'Rebuilt balances, {len(drift)} corrected')
+
+SEARCH_RESULT_LIMIT = 200
+
+def search_query(model, term, other_columns):
+    # Ranked prefix search through the FTS5 index (see fts_search) on
+    # SQLite; other databases fall back to ilike on name and other_columns
+    if db.engine.dialect.name != 'sqlite':
+        return model.query.filter(db.or_(*(
+            column.ilike(f'%{term}%') for column in (model.name, *other_columns)
+        ))).order_by(model.name)
+    
+    expression = match_expression(term)
+    if expression is None:
+        return model.query.filter(db.false())
+    ranked = db.text(ranked_ids_sql(model.__tablename__))\
+        .bindparams(query=expression)\
+        .columns(id=db.Integer, score=db.Float)\
+        .subquery()
+    return model.query.join(ranked, model.id == ranked.c.id).order_by(ranked.c.score, model.name)
+
+CUSTOMER_LOOKUP_LIMIT = 20
+
+def parse_customer_cursor(cursor):
+    # "<id>.<name>" of the last customer on the previous lookup page
+    if not cursor:
+        return None
+    try:
+        customer_id, name = cursor.split('.', 1)
+        return name, int(customer_id)
+    except ValueError:
+        return None
+
+@app.route('/api/customers/lookup')
+@login_required
+def api_customer_lookup():
+    # Name/mobile picker for the sale pages, one page at a time in
+    # (name, id) order
+    term = request.args.get('q', '').strip()
+    limit = min(max(request.args.get('limit', CUSTOMER_LOOKUP_LIMIT, type=int), 1), 100)
+    after = parse_customer_cursor(request.args.get('cursor'))
+    
+    query = Customer.query
+    if term and db.engine.dialect.name == 'sqlite':
+        expression = match_expression(term, ('name', 'mobile'))
+        if expression is None:
+            return jsonify({'success': True, 'customers': [], 'next_cursor': None})
+        matching = db.text(matching_ids_sql('customer')).bindparams(query=expression).columns(id=db.Integer)
+        query = query.filter(Customer.id.in_(matching))
+    elif term:
+        query = query.filter(Customer.name.ilike(f'%{term}%') | Customer.mobile.ilike(f'%{term}%'))
+    if after:
+        query = query.filter(db.tuple_(Customer.name, Customer.id) > db.tuple_(*after))
+    rows = query.order_by(Customer.name, Customer.id).limit(limit + 1).all()
+    
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = f'{last.id}.{last.name}'
+    return jsonify({
+        'success': True,
+        'customers': [{
+            'id': customer.id,
+            'name': customer.name,
+            'mobile': customer.mobile,
+            'balance': customer.balance or 0
+        } for customer in rows[:limit]],
+        'next_cursor': next_cursor
+    })
+
 @app.route('/customers')
 @login_required
 def customers():
     search_term = request.args.get('search', '')
     
     if search_term:
-        customers = Customer.query.filter(
-            (Customer.name.ilike(f'%{search_term}%')) | 
-            (Customer.mobile.ilike(f'%{search_term}%')) | 
-            (Customer.address.ilike(f'%{search_term}%'))
-        ).order_by(Customer.name).all()
+        # Best matches only; a short prefix can match most of the table
+        query = search_query(Customer, search_term, (Customer.mobile, Customer.address))\
+            .limit(SEARCH_RESULT_LIMIT)
     else:
-        customers = Customer.query.order_by(Customer.name).all()
+        query = Customer.query.order_by(Customer.name)
     
-    # Calculate total due for each customer and overall total
+    customers = query.all()
+    
+    # Balances are stored on the customer row, so no per-customer queries
     total_due_all = 0
     for customer in customers:
-        sales = Sale.query.filter_by(customer_id=customer.id).all()
-        payments = Payment.query.filter_by(customer_id=customer.id).all()
-        customer.total_due = sum(sale.due_amount for sale in sales) - sum(payment.amount for payment in payments)
+        customer.total_due = customer.balance or 0
         total_due_all += customer.total_due if customer.total_due > 0 else 0
     
     return render_template('customers.html', 
                          customers=customers, 
                          search_term=search_term,
+                         search_limited=bool(search_term) and len(customers) == SEARCH_RESULT_LIMIT,
                          total_due_all=total_due_all)
 
 
@@ -651,11 +1435,11 @@ def add_customer():
                         flash('Only image files (png, jpg, jpeg, gif) are allowed', 'danger')
                         return redirect(url_for('add_customer'))
                     
-                    filename = secure_filename(file.filename)
-                    unique_filename = f"{uuid.uuid4().hex}_{filename}"
-                    file_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-                    file.save(file_path)
-                    new_customer.photo_path = f"uploads/{unique_filename}"
+                    try:
+                        new_customer.photo_path = store_customer_photo(file.stream)
+                    except InvalidImage:
+                        flash('The uploaded file is not a valid image', 'danger')
+                        return redirect(url_for('add_customer'))
             
             db.session.add(new_customer)
             db.session.commit()
@@ -722,19 +1506,12 @@ def edit_customer(id):
                         flash('Only image files (png, jpg, jpeg, gif) are allowed', 'danger')
                         return redirect(url_for('edit_customer', id=id))
                     
-                    # Remove old photo if exists
-                    if customer.photo_path:
-                        try:
-                            os.remove(os.path.join('static', customer.photo_path))
-                        except Exception as e:
-                            app.logger.error(f"Error deleting old photo: {str(e)}")
-                    
-                    # Save new photo
-                    filename = secure_filename(file.filename)
-                    unique_filename = f"{uuid.uuid4().hex}_{filename}"
-                    file_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-                    file.save(file_path)
-                    customer.photo_path = f"uploads/{unique_filename}"
+                    try:
+                        new_photo_path = store_customer_photo(file.stream)
+                    except InvalidImage:
+                        flash('The uploaded file is not a valid image', 'danger')
+                        return redirect(url_for('edit_customer', id=id))
+                    customer.photo_path = new_photo_path
             
             db.session.commit()
             flash('Customer updated successfully', 'success')
@@ -753,20 +1530,13 @@ def delete_customer(id):
     customer = Customer.query.get_or_404(id)
     
     try:
-        # Delete related payments first
+        # Delete related payments first (the stored balance goes with the row)
         Payment.query.filter_by(customer_id=id).delete()
         
         # Update related sales to remove customer reference
         Sale.query.filter_by(customer_id=id).update({'customer_id': None})
         
-        # Delete customer photo if exists
-        if customer.photo_path:
-            try:
-                os.remove(os.path.join('static', customer.photo_path))
-            except Exception as e:
-                app.logger.error(f"Error deleting customer photo: {str(e)}")
-        
-        # Delete the customer
+        # Delete the customer (its photo goes with the next upload sweep)
         db.session.delete(customer)
         db.session.commit()
         
@@ -794,6 +1564,7 @@ def add_payment(customer_id):
         )
         
         db.session.add(new_payment)
+        adjust_customer_balance(customer_id, -amount)
         db.session.commit()
         
         flash('Payment added successfully', 'success')
@@ -818,6 +1589,8 @@ def edit_payment(customer_id, payment_id):
         payment_date = datetime.strptime(request.form['payment_date'], '%Y-%m-%d').date()
         description = request.form.get('description', '')
         
+        adjust_customer_balance(customer_id, payment.amount - amount)
+        
         payment.amount = amount
         payment.payment_date = payment_date
         payment.description = description
@@ -838,6 +1611,7 @@ def delete_payment(id):
     customer_id = payment.customer_id
     
     try:
+        adjust_customer_balance(customer_id, payment.amount)
         db.session.delete(payment)
         db.session.commit()
         flash('Payment deleted successfully', 'success')
@@ -848,81 +1622,160 @@ def delete_payment(id):
     return redirect(url_for('view_customer', id=customer_id))
 
 
+LEDGER_PAGE_SIZE = 50
+
+def customer_ledger_subquery(customer_id):
+    # The customer's sales and payments merged with UNION ALL, with the
+    # running balance as a window sum over the whole ledger in (date, kind, id)
+    # order. kind is 0 for sales and 1 for payments.
+    sales_q = db.select(
+        Sale.sale_date.label('date'),
+        db.literal(0).label('kind'),
+        Sale.id.label('id'),
+        ('Sale #' + Sale.bill_number).label('description'),
+        Sale.total_amount.label('amount'),
+        Sale.received_amount.label('payment'),
+        Sale.due_amount.label('delta')
+    ).where(Sale.customer_id == customer_id)
+    payments_q = db.select(
+        Payment.payment_date,
+        db.literal(1),
+        Payment.id,
+        db.func.coalesce(db.func.nullif(Payment.description, ''), 'Payment'),
+        db.literal(0.0),
+        Payment.amount,
+        -Payment.amount
+    ).where(Payment.customer_id == customer_id)
+    entries = db.union_all(sales_q, payments_q).subquery()
+    
+    return db.select(
+        entries,
+        db.func.sum(entries.c.delta).over(
+            order_by=(entries.c.date, entries.c.kind, entries.c.id)
+        ).label('balance')
+    ).subquery()
+
+def customer_ledger_page(customer_id, before=None, limit=LEDGER_PAGE_SIZE):
+    # One page of the customer's ledger, newest first, so every page shows the
+    # correct balance. `before` is the cursor returned with the previous page.
+    ledger = customer_ledger_subquery(customer_id)
+    query = db.select(ledger)
+    if before:
+        query = query.where(
+            db.tuple_(ledger.c.date, ledger.c.kind, ledger.c.id) <
+            db.tuple_(before[0], before[1], before[2])
+        )
+    query = query.order_by(
+        ledger.c.date.desc(), ledger.c.kind.desc(), ledger.c.id.desc()
+    ).limit(limit + 1)
+    
+    rows = db.session.execute(query).all()
+    entries = [{
+        'date': row.date,
+        'description': row.description,
+        'amount': row.amount,
+        'payment': row.payment,
+        'balance': row.balance,
+        'payment_id': row.id if row.kind == 1 else None,
+        'sale_id': row.id if row.kind == 0 else None
+    } for row in rows[:limit]]
+    
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = f"{last.date.isoformat()}.{last.kind}.{last.id}"
+    return entries, next_cursor
+
+def parse_ledger_cursor(cursor):
+    # Inverse of the cursor format built in customer_ledger_page
+    if not cursor:
+        return None
+    try:
+        day, kind, row_id = cursor.split('.')
+        return datetime.strptime(day, '%Y-%m-%d').date(), int(kind), int(row_id)
+    except ValueError:
+        return None
+
 @app.route('/customers/<int:id>')
 @login_required
+@query_budget(8)
 def view_customer(id):
     customer = Customer.query.get_or_404(id)
+    customer_balance = customer.balance or 0
     
-    # Calculate customer balance
-    sales = Sale.query.filter_by(customer_id=id).all()
-    payments = Payment.query.filter_by(customer_id=id).all()
-    customer_balance = sum(sale.due_amount for sale in sales) - sum(payment.amount for payment in payments)
-    
-    # Prepare ledger entries
-    ledger = []
-    balance = 0
+    # Ledger page (older pages are reached through the cursor link)
+    before = parse_ledger_cursor(request.args.get('before'))
+    ledger, next_cursor = customer_ledger_page(id, before)
     
-    # Add sales to ledger
-    for sale in sales:
-        balance += sale.due_amount
-        ledger.append({
-            'date': sale.sale_date,
-            'description': f'Sale #{sale.bill_number}',
-            'amount': sale.total_amount,
-            'payment': sale.received_amount,
-            'balance': balance,
-            'payment_id': None  # Sales don't have payment IDs
-        })
-    
-    # Add payments to ledger
-    for payment in payments:
-        balance -= payment.amount
-        ledger.append({
-            'date': payment.payment_date,
-            'description': payment.description or 'Payment',
-            'amount': 0,
-            'payment': payment.amount,
-            'balance': balance,
-            'payment_id': payment.id  # Include payment ID for editing
-        })
-    
-    # Sort ledger by date
-    ledger.sort(key=lambda x: x['date'], reverse=True)
+    # Recent transactions for the tabs
+    sales = Sale.query.filter_by(customer_id=id)\
+        .order_by(Sale.sale_date.desc(), Sale.id.desc()).limit(LEDGER_PAGE_SIZE).all()
+    payments = Payment.query.filter_by(customer_id=id)\
+        .order_by(Payment.payment_date.desc(), Payment.id.desc()).limit(LEDGER_PAGE_SIZE).all()
+    sales_count = Sale.query.filter_by(customer_id=id).count()
+    payments_count = Payment.query.filter_by(customer_id=id).count()
     
     return render_template('view_customer.html',
                          customer=customer,
                          customer_balance=customer_balance,
                          ledger=ledger,
+                         next_cursor=next_cursor,
+                         is_first_page=before is None,
                          sales=sales,
                          payments=payments,
+                         sales_count=sales_count,
+                         payments_count=payments_count,
                          date=date)
 
+@app.route('/customers/<int:id>/ledger')
+@login_required
+def customer_ledger(id):
+    Customer.query.get_or_404(id)
+    
+    limit = min(request.args.get('limit', LEDGER_PAGE_SIZE, type=int), 500)
+    before = parse_ledger_cursor(request.args.get('before'))
+    entries, next_cursor = customer_ledger_page(id, before, max(limit, 1))
+    
+    for entry in entries:
+        entry['date'] = entry['date'].isoformat()
+    
+    return jsonify({
+        'success': True,
+        'entries': entries,
+        'next_cursor': next_cursor
+    })
+
 @app.route('/customers/<int:id>/clear_ledger', methods=['POST'])
 @login_required
 def clear_ledger(id):
     customer = Customer.query.get_or_404(id)
     
-    # Calculate customer balance
-    sales = Sale.query.filter_by(customer_id=id).all()
-    payments = Payment.query.filter_by(customer_id=id).all()
-    customer_balance = sum(sale.due_amount for sale in sales) - sum(payment.amount for payment in payments)
-    
     # Check if balance is zero
-    if abs(customer_balance) > 0.01:
+    if abs(customer.balance or 0) > 0.01:
         flash('Cannot clear ledger: Customer balance is not zero', 'danger')
         return redirect(url_for('view_customer', id=id))
     
     try:
         # 1. Update all sales: remove customer association AND mark as fully paid
-        for sale in sales:
+        summary_changes = {}
+        for sale in Sale.query.filter_by(customer_id=id).all():
             sale.customer_id = None  # Remove customer association
             if sale.due_amount > 0:  # If there was any due amount
+                changes = summary_changes.setdefault(sale.sale_date, {'received_amount': 0.0, 'due_amount': 0.0})
+                changes['received_amount'] += sale.total_amount - sale.received_amount
+                changes['due_amount'] -= sale.due_amount
                 sale.received_amount = sale.total_amount  # Mark as fully paid
                 sale.due_amount = 0.0  # Set due to zero
         
+        for sale_date, changes in summary_changes.items():
+            adjust_daily_summary(sale_date, changes)
+        
         # 2. Delete all payment records for this customer
         Payment.query.filter_by(customer_id=id).delete()
         
+        # 3. Nothing left on the ledger
+        customer.balance = 0.0
+        
         db.session.commit()
         flash('Ledger cleared successfully. All sales converted to Walk-in customer records, marked as paid, and payment records removed.', 'success')
         
@@ -939,17 +1792,15 @@ def suppliers():
     search_term = request.args.get('search', '')
     
     if search_term:
-        suppliers = Supplier.query.filter(
-            (Supplier.name.ilike(f'%{search_term}%')) | 
-            (Supplier.mobile.ilike(f'%{search_term}%')) | 
-            (Supplier.gstin.ilike(f'%{search_term}%'))
-        ).order_by(Supplier.name).all()
+        suppliers = search_query(Supplier, search_term, (Supplier.mobile, Supplier.gstin))\
+            .limit(SEARCH_RESULT_LIMIT).all()
     else:
         suppliers = Supplier.query.order_by(Supplier.name).all()
     
     return render_template('suppliers.html', 
                          suppliers=suppliers, 
-                         search_term=search_term)
+                         search_term=search_term,
+                         search_limited=bool(search_term) and len(suppliers) == SEARCH_RESULT_LIMIT)
 
 @app.route('/suppliers/add', methods=['GET', 'POST'])
 @login_required
@@ -1218,62 +2069,491 @@ def clear_supplier_ledger(id):
 
 
 # Reports
+REPORT_PAGE_SIZE = 30
+REPORT_GROUPINGS = ('day', 'week', 'month')
+
+def sales_page(query, before=None, limit=REPORT_PAGE_SIZE, after=None):
+    # Keyset page of a Sale query, newest first on (sale_date, id). `before`
+    # (older rows) or `after` (newer rows) is a (date, id) cursor from
+    # parse_sale_cursor. Returns (sales, next_cursor, prev_cursor): the
+    # cursors for the older and newer neighbouring pages, if any.
+    if after:
+        rows = query.filter(db.tuple_(Sale.sale_date, Sale.id) > db.tuple_(*after))\
+            .order_by(Sale.sale_date, Sale.id).limit(limit + 1).all()
+        has_newer, has_older = len(rows) > limit, True
+        rows = rows[:limit][::-1]
+    else:
+        if before:
+            query = query.filter(db.tuple_(Sale.sale_date, Sale.id) < db.tuple_(*before))
+        rows = query.order_by(Sale.sale_date.desc(), Sale.id.desc()).limit(limit + 1).all()
+        has_newer, has_older = before is not None, len(rows) > limit
+        rows = rows[:limit]
+    
+    next_cursor = prev_cursor = None
+    if rows and has_older:
+        next_cursor = f"{rows[-1].sale_date.isoformat()}.{rows[-1].id}"
+    if rows and has_newer:
+        prev_cursor = f"{rows[0].sale_date.isoformat()}.{rows[0].id}"
+    return rows, next_cursor, prev_cursor
+
+def parse_sale_cursor(cursor):
+    # Inverse of the cursor format built in sales_page
+    if not cursor:
+        return None
+    try:
+        day, sale_id = cursor.split('.')
+        return datetime.strptime(day, '%Y-%m-%d').date(), int(sale_id)
+    except ValueError:
+        return None
+
+def daily_summary_groups(start_date, end_date, group_by):
+    # Rollup rows for the range bucketed by day, week (starting Monday) or
+    # month. Reads at most one row per day, never the sales themselves.
+    rows = DailySalesSummary.query.filter(
+        DailySalesSummary.sale_date >= start_date,
+        DailySalesSummary.sale_date <= end_date
+    ).order_by(DailySalesSummary.sale_date.desc()).all()
+    
+    groups = []
+    for row in rows:
+        if group_by == 'month':
+            period = row.sale_date.replace(day=1)
+        elif group_by == 'week':
+            period = row.sale_date - timedelta(days=row.sale_date.weekday())
+        else:
+            period = row.sale_date
+        
+        if not groups or groups[-1]['period'] != period:
+            groups.append(dict({field: 0 for field in SUMMARY_FIELDS}, period=period))
+        for field in SUMMARY_FIELDS:
+            groups[-1][field] += getattr(row, field)
+    return groups
+
 @app.route('/reports/sales')
 @login_required
 def sales_report():
-    start_date = request.args.get('start_date')
-    end_date = request.args.get('end_date', date.today().isoformat())
+    # Default to last 30 days if no dates provided
+    end_date = date.today()
+    start_date = end_date - timedelta(days=30)
     
-    if start_date:
+    if request.args.get('start_date'):
         try:
-            start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
-            end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
-            
-            sales = Sale.query.filter(
-                Sale.sale_date >= start_date,
-                Sale.sale_date <= end_date
-            ).order_by(Sale.sale_date.desc(), Sale.id.desc()).limit(30).all()
-            
-            total_sales = sum(sale.total_amount for sale in sales)
-            total_profit = sum(sale.total_profit for sale in sales)
-            total_received = sum(sale.received_amount for sale in sales)
-            total_due = sum(sale.due_amount for sale in sales)
-            
-            return render_template('sales_report.html', 
-                                sales=sales,
-                                start_date=start_date,
-                                end_date=end_date,
-                                total_sales=total_sales,
-                                total_profit=total_profit,
-                                total_received=total_received,
-                                total_due=total_due)
+            start_date = datetime.strptime(request.args['start_date'], '%Y-%m-%d').date()
+            end_date = datetime.strptime(request.args.get('end_date') or date.today().isoformat(), '%Y-%m-%d').date()
         except ValueError:
             flash('Invalid date format', 'danger')
+            end_date = date.today()
+            start_date = end_date - timedelta(days=30)
+    
+    group_by = request.args.get('group_by')
+    if group_by not in REPORT_GROUPINGS:
+        group_by = None
+    
+    # Totals over the whole range come from the daily rollup
+    summary = daily_summary_totals(start_date, end_date)
+    groups = daily_summary_groups(start_date, end_date, group_by) if group_by else []
+    
+    # The listing is paged separately
+    before = parse_sale_cursor(request.args.get('before'))
+    after = parse_sale_cursor(request.args.get('after'))
+    sales, next_cursor, prev_cursor = sales_page(
+        Sale.query.options(db.joinedload(Sale.customer)).filter(
+            Sale.sale_date >= start_date,
+            Sale.sale_date <= end_date
+        ),
+        before,
+        after=after
+    )
     
-    # Default to last 30 days if no dates provided
+    return render_template('sales_report.html', 
+                         sales=sales,
+                         start_date=start_date,
+                         end_date=end_date,
+                         group_by=group_by,
+                         groups=groups,
+                         next_cursor=next_cursor,
+                         prev_cursor=prev_cursor,
+                         is_first_page=prev_cursor is None,
+                         bill_count=summary['bill_count'],
+                         total_sales=summary['total_amount'],
+                         total_profit=summary['total_profit'],
+                         total_received=summary['received_amount'],
+                         total_due=summary['due_amount'],
+                         total_cash=summary['cash_amount'],
+                         total_online=summary['online_amount'])
+
+# Exports
+EXPORT_BATCH_SIZE = 1000
+
+def export_response(rows, header, filename, sheet_name):
+    # Stream rows as CSV or XLSX depending on ?format=; rows is a lazy
+    # iterable that keeps the app context (see stream_with_context)
+    export_format = request.args.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        export_format = 'csv'
+    
+    response = Response(
+        stream_with_context(iter_export(export_format, header, rows, sheet_name)),
+        mimetype=EXPORT_FORMATS[export_format]
+    )
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}.{export_format}"'
+    return response
+
+def report_date_range():
+    # (start_date, end_date) from the query string, last 30 days by default
     end_date = date.today()
     start_date = end_date - timedelta(days=30)
+    if request.args.get('start_date'):
+        start_date = datetime.strptime(request.args['start_date'], '%Y-%m-%d').date()
+        end_date = datetime.strptime(request.args.get('end_date') or date.today().isoformat(), '%Y-%m-%d').date()
+    return start_date, end_date
+
+@app.route('/export/sales')
+@login_required
+def export_sales():
+    try:
+        start_date, end_date = report_date_range()
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Invalid date format'}), 400
+    
+    # One row per sale line, read in batches off a server-side cursor
+    query = db.select(
+        Sale.sale_date, Sale.sale_time, Sale.bill_number,
+        db.func.coalesce(Customer.name, 'Walk-in'),
+        Sale.payment_method, Sale.total_amount, Sale.received_amount, Sale.due_amount,
+        Item.name, SaleItem.quantity, SaleItem.unit, SaleItem.sale_price,
+        SaleItem.purchase_price, SaleItem.profit
+    ).select_from(SaleItem)\
+        .join(Sale, SaleItem.sale_id == Sale.id)\
+        .outerjoin(Customer, Sale.customer_id == Customer.id)\
+        .outerjoin(Item, SaleItem.item_id == Item.id)\
+        .where(Sale.sale_date >= start_date, Sale.sale_date <= end_date)\
+        .order_by(Sale.sale_date, Sale.id, SaleItem.id)\
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    
+    def rows():
+        yield from db.session.execute(query)
+    
+    header = ['Date', 'Time', 'Bill No', 'Customer', 'Payment Method', 'Bill Total',
+              'Bill Received', 'Bill Due', 'Item', 'Quantity', 'Unit', 'Sale Price',
+              'Purchase Price', 'Profit']
+    return export_response(rows(), header, f'sales_{start_date}_{end_date}', 'Sales')
+
+@app.route('/customers/<int:id>/ledger/export')
+@login_required
+def export_customer_ledger(id):
+    customer = Customer.query.get_or_404(id)
     
-    sales = Sale.query.filter(
-        Sale.sale_date >= start_date,
-        Sale.sale_date <= end_date
-    ).order_by(Sale.sale_date.desc(), Sale.id.desc()).limit(30).all()
+    ledger = customer_ledger_subquery(id)
+    query = db.select(
+        ledger.c.date, ledger.c.description, ledger.c.amount, ledger.c.payment, ledger.c.balance
+    ).order_by(ledger.c.date, ledger.c.kind, ledger.c.id)\
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
     
-    total_sales = sum(sale.total_amount for sale in sales)
-    total_profit = sum(sale.total_profit for sale in sales)
-    total_received = sum(sale.received_amount for sale in sales)
-    total_due = sum(sale.due_amount for sale in sales)
+    def rows():
+        yield from db.session.execute(query)
     
-    return render_template('sales_report.html', 
-                         sales=sales,
-                         start_date=start_date,
-                         end_date=end_date,
-                         total_sales=total_sales,
-                         total_profit=total_profit,
-                         total_received=total_received,
-                         total_due=total_due)
+    header = ['Date', 'Description', 'Amount', 'Payment', 'Balance']
+    filename = f'ledger_{customer.id}_{secure_filename(customer.name) or "customer"}'
+    return export_response(rows(), header, filename, 'Ledger')
+
+@app.route('/suppliers/<int:supplier_id>/statement/export')
+@login_required
+def export_supplier_statement(supplier_id):
+    supplier = Supplier.query.get_or_404(supplier_id)
+    
+    query = db.select(
+        SupplierTransaction.date, SupplierTransaction.bill_no, SupplierTransaction.description,
+        SupplierTransaction.transaction_type, SupplierTransaction.amount
+    ).where(SupplierTransaction.supplier_id == supplier_id)\
+        .order_by(SupplierTransaction.date, SupplierTransaction.id)\
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    
+    def rows():
+        # Running balance as in supplier_statement
+        balance = 0
+        for day, bill_no, description, transaction_type, amount in db.session.execute(query):
+            balance += amount if transaction_type == 'purchase' else -amount
+            yield (day, bill_no, description,
+                   amount if transaction_type == 'purchase' else 0,
+                   amount if transaction_type == 'payment' else 0,
+                   balance)
+    
+    header = ['Date', 'Bill No', 'Description', 'Purchase', 'Payment', 'Balance']
+    filename = f'statement_{supplier.id}_{secure_filename(supplier.name) or "supplier"}'
+    return export_response(rows(), header, filename, 'Statement')
+
+# Batch PDFs (closing-time reprints of bills and customer statements)
+BATCH_PDF_DIR = os.path.join(app.instance_path, 'batch_pdf')
+BATCH_PDF_KINDS = ('invoices', 'statements')
+BATCH_PDF_MAX_AGE = 24 * 60 * 60
+# A queued or running job whose status hasn't changed for this long, or whose
+# worker process is gone, was lost with a restarted worker
+BATCH_PDF_STALE_AFTER = 30 * 60
+
+def customer_statement_data(customer, start_date, end_date):
+    # Plain-data ledger statement for pdf_documents, balances as in view_customer
+    ledger = customer_ledger_subquery(customer.id)
+    opening = db.session.execute(
+        db.select(ledger.c.balance)
+        .where(ledger.c.date < start_date)
+        .order_by(ledger.c.date.desc(), ledger.c.kind.desc(), ledger.c.id.desc())
+        .limit(1)
+    ).scalar() or 0
+    rows = db.session.execute(
+        db.select(ledger)
+        .where(ledger.c.date >= start_date, ledger.c.date <= end_date)
+        .order_by(ledger.c.date, ledger.c.kind, ledger.c.id)
+    ).all()
+    
+    return {
+        'customer': customer.name,
+        'mobile': customer.mobile,
+        'start_date': start_date.strftime('%d-%m-%Y'),
+        'end_date': end_date.strftime('%d-%m-%Y'),
+        'opening_balance': opening,
+        'entries': [(
+            row.date.strftime('%d-%m-%Y'), row.description, row.amount, row.payment, row.balance
+        ) for row in rows],
+        'closing_balance': rows[-1].balance if rows else opening
+    }
+
+def batch_pdf_documents(start_date, end_date, customer_ids=None, kinds=BATCH_PDF_KINDS):
+    # (kind, name, data) tuples for render_batch: the bills in the date range,
+    # then one statement per customer. Without a customer list, statements
+    # cover every customer with sales or payments in the range.
+    documents = []
+    
+    if 'invoices' in kinds:
+        query = Sale.query.options(
+            db.joinedload(Sale.customer),
+            db.selectinload(Sale.items).joinedload(SaleItem.item)
+        ).filter(Sale.sale_date >= start_date, Sale.sale_date <= end_date)
+        if customer_ids:
+            query = query.filter(Sale.customer_id.in_(customer_ids))
+        for sale in query.order_by(Sale.sale_date, Sale.id):
+            documents.append(('invoice', f'invoice_{sale.bill_number}', sale_invoice_data(sale)))
+    
+    if 'statements' in kinds:
+        if not customer_ids:
+            active = db.union(
+                db.select(Sale.customer_id).where(
+                    Sale.sale_date >= start_date, Sale.sale_date <= end_date,
+                    Sale.customer_id.isnot(None)
+                ),
+                db.select(Payment.customer_id).where(
+                    Payment.payment_date >= start_date, Payment.payment_date <= end_date
+                )
+            ).subquery()
+            customer_ids = db.select(active.c.customer_id)
+        customers = Customer.query.filter(Customer.id.in_(customer_ids))\
+            .order_by(Customer.name, Customer.id).all()
+        for customer in customers:
+            name = f'statement_{customer.id}_{secure_filename(customer.name) or "customer"}'
+            documents.append(('statement', name, customer_statement_data(customer, start_date, end_date)))
+    
+    return documents
+
+def write_batch_status(job_id, **status):
+    # Job state lives on disk so any gunicorn worker can answer progress polls.
+    # The writing process is recorded so a poll can tell when it has died.
+    status.update(pid=os.getpid(), host=socket.gethostname(), updated=datetime.now().timestamp())
+    path = os.path.join(BATCH_PDF_DIR, f'{job_id}.json')
+    tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(status, f)
+    os.replace(tmp_path, path)
+
+def batch_job_lost(status):
+    # True for a queued or running job that no process is working on anymore
+    if status['state'] not in ('queued', 'running'):
+        return False
+    if datetime.now().timestamp() - status.get('updated', 0) > BATCH_PDF_STALE_AFTER:
+        return True
+    if status.get('host') != socket.gethostname():
+        return False
+    try:
+        os.kill(status['pid'], 0)
+    except ProcessLookupError:
+        return True
+    except OSError:
+        pass
+    return False
+
+def read_batch_status(job_id):
+    try:
+        with open(os.path.join(BATCH_PDF_DIR, f'{job_id}.json')) as f:
+            status = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if batch_job_lost(status):
+        app.logger.warning(f'Batch PDF job {job_id} was interrupted, marking it failed')
+        status.update(state='failed', message='The job was interrupted (worker restarted), start it again')
+        write_batch_status(job_id, **status)
+    return status
+
+def prune_batch_jobs():
+    # Finished job files are kept for a day for download, then removed
+    cutoff = datetime.now().timestamp() - BATCH_PDF_MAX_AGE
+    for entry in os.scandir(BATCH_PDF_DIR):
+        if entry.is_file() and entry.stat().st_mtime < cutoff:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+def run_batch_job(job_id, start_date, end_date, customer_ids, kinds, output_format):
+    # Background thread: gather the data, then render on the process pool
+    status = {'state': 'running', 'done': 0, 'total': 0, 'format': output_format,
+              'filename': f'documents_{start_date}_{end_date}.{output_format}'}
+    output_path = os.path.join(BATCH_PDF_DIR, f'{job_id}.{output_format}')
+    try:
+        with app.app_context():
+            documents = batch_pdf_documents(start_date, end_date, customer_ids, kinds)
+            resource_args = invoice_resource_args()
+        status['total'] = len(documents)
+        write_batch_status(job_id, **status)
+        
+        def progress(done, total):
+            status['done'] = done
+            write_batch_status(job_id, **status)
+        
+        render_batch(documents, output_path, resource_args, merged=output_format == 'pdf',
+                     workers=app.config['BATCH_PDF_WORKERS'], progress=progress)
+        status['state'] = 'finished'
+    except Exception as e:
+        app.logger.error(f"Batch PDF job {job_id} failed: {str(e)}")
+        status['state'] = 'failed'
+        status['message'] = str(e)
+    write_batch_status(job_id, **status)
+
+# Request profiles (see request_profiler): an admin adds ?_profile=1 to
+# any URL, or sends X-Profile: 1, and the profile shows up here
+PROFILE_DIR = os.path.join(app.instance_path, 'profiles')
+init_request_profiler(app, PROFILE_DIR, lambda: session.get('role') == 'admin')
+
+@app.route('/admin/profiles')
+@admin_required
+def profiles():
+    return render_template('profiles.html', profiles=list_profiles(PROFILE_DIR))
+
+@app.route('/admin/profiles/<name>')
+@admin_required
+def view_profile(name):
+    if not PROFILE_NAME.match(name) or not os.path.exists(os.path.join(PROFILE_DIR, name)):
+        return jsonify({'success': False, 'message': 'Profile not found'}), 404
+    if name.endswith('.prof') and request.args.get('download') != '1':
+        sort = request.args.get('sort', 'cumulative')
+        if sort not in ('cumulative', 'tottime', 'ncalls'):
+            sort = 'cumulative'
+        return Response(stats_text(os.path.join(PROFILE_DIR, name), sort), mimetype='text/plain')
+    return send_from_directory(PROFILE_DIR, name, as_attachment=name.endswith('.prof'))
+
+@app.route('/admin/batch-pdf', methods=['POST'])
+@admin_required
+def start_batch_pdf():
+    data = request.get_json(silent=True) or request.form
+    try:
+        start_date = datetime.strptime(data.get('start_date') or date.today().isoformat(), '%Y-%m-%d').date()
+        end_date = datetime.strptime(data.get('end_date') or start_date.isoformat(), '%Y-%m-%d').date()
+        customer_ids = data.getlist('customer_ids') if hasattr(data, 'getlist') else data.get('customer_ids') or []
+        customer_ids = [int(customer_id) for customer_id in customer_ids]
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'Invalid date or customer id'}), 400
+    
+    kinds = data.get('documents') or 'all'
+    kinds = BATCH_PDF_KINDS if kinds == 'all' else (kinds,)
+    output_format = data.get('format') or 'zip'
+    if any(kind not in BATCH_PDF_KINDS for kind in kinds) or output_format not in ('pdf', 'zip'):
+        return jsonify({'success': False, 'message': 'Unknown document type or format'}), 400
+    
+    os.makedirs(BATCH_PDF_DIR, exist_ok=True)
+    prune_batch_jobs()
+    job_id = uuid.uuid4().hex
+    write_batch_status(job_id, state='queued', done=0, total=0, format=output_format)
+    threading.Thread(
+        target=run_batch_job,
+        args=(job_id, start_date, end_date, customer_ids, kinds, output_format),
+        daemon=True
+    ).start()
+    
+    return jsonify({
+        'success': True,
+        'job_id': job_id,
+        'status_url': url_for('batch_pdf_status', job_id=job_id)
+    }), 202
+
+@app.route('/admin/batch-pdf/<job_id>')
+@admin_required
+def batch_pdf_status(job_id):
+    status = read_batch_status(secure_filename(job_id))
+    if status is None:
+        return jsonify({'success': False, 'message': 'Unknown job'}), 404
+    if status['state'] == 'finished':
+        status['download_url'] = url_for('download_batch_pdf', job_id=job_id)
+    return jsonify(dict(status, success=True))
+
+@app.route('/admin/batch-pdf/<job_id>/download')
+@admin_required
+def download_batch_pdf(job_id):
+    job_id = secure_filename(job_id)
+    status = read_batch_status(job_id)
+    if status is None or status['state'] != 'finished':
+        return jsonify({'success': False, 'message': 'Job not finished'}), 404
+    
+    return send_file(
+        os.path.join(BATCH_PDF_DIR, f"{job_id}.{status['format']}"),
+        mimetype='application/pdf' if status['format'] == 'pdf' else 'application/zip',
+        as_attachment=True,
+        download_name=status['filename']
+    )
+
+@app.cli.command('batch-pdf')
+@click.argument('output', type=click.Path(dir_okay=False))
+@click.option('--start', 'start_date', type=click.DateTime(['%Y-%m-%d']), help='First day (default today).')
+@click.option('--end', 'end_date', type=click.DateTime(['%Y-%m-%d']), help='Last day (default --start).')
+@click.option('--customer', 'customer_ids', type=int, multiple=True, help='Customer id; repeat for several.')
+@click.option('--documents', type=click.Choice(['all', *BATCH_PDF_KINDS]), default='all', show_default=True)
+@click.option('--workers', type=int, help='Worker processes (default one per CPU).')
+def batch_pdf_command(output, start_date, end_date, customer_ids, documents, workers):
+    """Render bills and customer statements to OUTPUT (.pdf merged, or .zip)."""
+    if not output.endswith(('.pdf', '.zip')):
+        raise click.BadParameter('must end in .pdf or .zip', param_hint='OUTPUT')
+    start_date = start_date.date() if start_date else date.today()
+    end_date = end_date.date() if end_date else start_date
+    kinds = BATCH_PDF_KINDS if documents == 'all' else (documents,)
+    
+    documents = batch_pdf_documents(start_date, end_date, list(customer_ids), kinds)
+    if not documents:
+        raise click.ClickException('Nothing to render for that range')
+    
+    with click.progressbar(length=len(documents), label=f'Rendering {len(documents)} documents') as bar:
+        def progress(done, total):
+            bar.update(done - bar.pos)
+        render_batch(documents, output, invoice_resource_args(), merged=output.endswith('.pdf'),
+                     workers=workers or app.config['BATCH_PDF_WORKERS'], progress=progress)
+    click.echo(f'Wrote {output}')
 
 # AJAX endpoints for sales processing
+# The cart lives in cart_store under an id kept in the session; each call
+# changes one line and answers with just that line plus the new totals.
+def current_cart_id(create=False):
+    cart_id = session.get('cart_id')
+    if cart_id is None and create:
+        cart_id = session['cart_id'] = uuid.uuid4().hex
+    return cart_id
+
+def cart_response(cart_id, **changes):
+    cart_count, subtotal = cart_store.summary(cart_id) if cart_id else (0, 0.0)
+    return jsonify({'success': True, 'cart_count': cart_count, 'subtotal': subtotal, **changes})
+
+@app.route('/api/cart')
+@login_required
+def get_cart():
+    cart_id = current_cart_id()
+    cart = list(cart_store.lines(cart_id).values()) if cart_id else []
+    return cart_response(cart_id, cart=cart)
+
 @app.route('/api/add_to_cart', methods=['POST'])
 @login_required
 def add_to_cart():
@@ -1287,64 +2567,152 @@ def add_to_cart():
     if quantity <= 0:
         return jsonify({'success': False, 'message': 'Quantity must be positive'})
     
-    if quantity > item.quantity:
+    cart_id = current_cart_id(create=True)
+    if cart_store.quantity(cart_id, item.id) + quantity > item.quantity:
         return jsonify({'success': False, 'message': f'Not enough stock. Available: {item.quantity} {item.unit}'})
     
-    # Get or initialize cart in session
-    cart = session.get('sale_cart', [])
-    
-    # Check if item already in cart
-    item_in_cart = next((i for i in cart if i['item_id'] == item_id), None)
-    
-    if item_in_cart:
-        item_in_cart['quantity'] += quantity
-    else:
-        cart.append({
-            'item_id': item.id,
-            'id': item.id,  # Make sure this is included
-            'name': item.name,
-            'quantity': quantity,
-            'unit': item.unit,
-            'purchase_price': item.purchase_price,  # This is critical
-            'sale_price': item.sale_price,
-            'price': item.sale_price  # For compatibility
-        })
-    
-    session['sale_cart'] = cart
+    try:
+        line, delta = cart_store.add(cart_id, item, quantity)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': f'Failed to update cart: {str(e)}'})
     
-    return jsonify({
-        'success': True,
-        'cart': cart,
-        'cart_count': len(cart),
-        'subtotal': sum(item['quantity'] * item['sale_price'] for item in cart)
-    })
+    return cart_response(cart_id, line=line, subtotal_delta=delta)
 
 @app.route('/api/remove_from_cart', methods=['POST'])
 @login_required
 def remove_from_cart():
     item_id = request.json.get('item_id')
     
-    cart = session.get('sale_cart', [])
-    cart = [item for item in cart if item['item_id'] != item_id]
+    cart_id = current_cart_id()
+    if cart_id is None:
+        return cart_response(cart_id, removed=None, subtotal_delta=0.0)
     
-    session['sale_cart'] = cart
+    try:
+        removed, delta = cart_store.remove(cart_id, item_id)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': f'Failed to update cart: {str(e)}'})
     
-    return jsonify({
-        'success': True,
-        'cart': cart,
-        'cart_count': len(cart),
-        'subtotal': sum(item['quantity'] * item['sale_price'] for item in cart)
-    })
+    return cart_response(cart_id, removed=removed, subtotal_delta=delta)
 
 @app.route('/api/clear_cart', methods=['POST'])
 @login_required
 def clear_cart():
-    session.pop('sale_cart', None)
+    cart_id = session.pop('cart_id', None)
+    if cart_id:
+        cart_store.clear(cart_id)
     return jsonify({'success': True})
 
+@app.cli.command('prune-carts')
+@click.option('--days', type=float, default=CART_MAX_AGE.days, show_default=True,
+              help='Drop carts not touched for this many days.')
+def prune_carts_command(days):
+    """Delete abandoned sale carts."""
+    count = cart_store.prune(timedelta(days=days))
+    click.echo(f'Removed {count} cart(s)')
+
+@app.cli.command('process-photos')
+def process_photos_command():
+    """Re-encode customer photos uploaded before thumbnails existed."""
+    converted = 0
+    for customer in Customer.query.filter(Customer.photo_path.isnot(None)):
+        path = os.path.join('static', customer.photo_path)
+        if os.path.exists(os.path.join('static', thumbnail_name(customer.photo_path, 'sm', 'webp'))):
+            continue
+        try:
+            with open(path, 'rb') as f:
+                customer.photo_path = store_customer_photo(f)
+        except (OSError, InvalidImage) as e:
+            click.echo(f'Customer {customer.id}: skipped {path} ({e})')
+            continue
+        db.session.commit()
+        converted += 1
+    click.echo(f'Converted {converted} photo(s); run `flask sweep-uploads` to remove the originals')
+
+def photo_refcounts():
+    # {photo_path: number of customers using it}
+    return dict(db.session.query(Customer.photo_path, db.func.count())
+                .filter(Customer.photo_path.isnot(None))
+                .group_by(Customer.photo_path).all())
+
+@app.cli.command('sweep-uploads')
+@click.option('--dry-run', is_flag=True, help='Only report what would be removed.')
+@click.option('--min-age', type=int, default=3600, show_default=True,
+              help='Keep unreferenced files younger than this many seconds.')
+def sweep_uploads_command(dry_run, min_age):
+    """Remove upload files no customer references anymore."""
+    refcounts = photo_refcounts()
+    referenced = [os.path.relpath(path, 'uploads') for path in refcounts]
+    files, reclaimed = sweep_photos(app.config['UPLOAD_FOLDER'], referenced, min_age, dry_run)
+    shared = sum(1 for count in refcounts.values() if count > 1)
+    click.echo(f'{len(refcounts)} photo(s) referenced, {shared} shared by several customers')
+    click.echo(f"{'Would remove' if dry_run else 'Removed'} {files} file(s), "
+               f'{reclaimed / 1024 / 1024:.2f} MB')
+
+# Benchmarking
+@app.cli.group()
+def bench():
+    """Seed synthetic data and benchmark the main pages."""
+
+@bench.command('seed')
+@click.option('--items', type=int, help='Number of items.')
+@click.option('--customers', type=int, help='Number of customers.')
+@click.option('--suppliers', type=int, help='Number of suppliers.')
+@click.option('--sales', type=int, help='Number of sales.')
+@click.option('--lines-per-sale', type=int, help='Line items per sale.')
+@click.option('--payments', type=int, help='Number of customer payments.')
+@click.option('--supplier-transactions', type=int, help='Number of supplier transactions.')
+@click.option('--days', type=int, help='Spread dates over this many past days.')
+@click.option('--seed', 'rng_seed', type=int, default=42, show_default=True, help='Random seed.')
+def bench_seed_command(rng_seed, **counts):
+    """Fill the database (DATABASE_URL) with synthetic data."""
+    from bench.seed import seed_database
+    
+    counts = {name: value for name, value in counts.items() if value is not None}
+    try:
+        used = seed_database(counts, seed=rng_seed)
+    except RuntimeError as e:
+        raise click.ClickException(str(e))
+    click.echo('Seeded ' + ', '.join(f'{value} {name}' for name, value in used.items()))
+
+@bench.command('run')
+@click.option('--iterations', type=int, default=50, show_default=True, help='Requests per endpoint.')
+@click.option('--output', type=click.Path(dir_okay=False), help='Save results as JSON.')
+@click.option('--compare', type=click.Path(exists=True, dir_okay=False), help='Earlier JSON results to compare with.')
+def bench_run_command(iterations, output, compare):
+    """Benchmark the main endpoints with the test client."""
+    from bench.runner import run_benchmark, format_results, load_results, save_results
+    
+    results = run_benchmark(app, iterations=iterations)
+    click.echo(format_results(results, load_results(compare) if compare else None))
+    if output:
+        save_results(results, output)
+        click.echo(f'Results saved to {output}')
+
+def create_schema():
+    # A new database gets every table straight from the models and is stamped
+    # at the latest revision. Existing databases are brought up to date by the
+    # Alembic revisions in migrations/versions (`alembic upgrade head`, the
+    # Procfile release step), never here.
+    scripts = ScriptDirectory.from_config(AlembicConfig(os.path.join(app.root_path, 'alembic.ini')))
+    if db.inspect(db.engine).get_table_names():
+        with db.engine.connect() as conn:
+            current = MigrationContext.configure(conn).get_current_revision()
+        if current != scripts.get_current_head():
+            app.logger.warning(f'Database schema is at revision {current}, run `alembic upgrade head`')
+        return
+    
+    db.create_all()
+    with db.engine.begin() as conn:
+        # Full-text search tables and their sync triggers (SQLite only)
+        if conn.dialect.name == 'sqlite':
+            create_search_index(conn)
+        MigrationContext.configure(conn).stamp(scripts, 'head')
+
 # Create tables and admin user
 with app.app_context():
-    db.create_all()
+    create_schema()
     create_admin_user()
 
 if __name__ == '__main__':
@@ -0,0 +1 @@
+"""Load-testing helpers: synthetic data (seed) and the endpoint runner."""
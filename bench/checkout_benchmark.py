@@ -0,0 +1,166 @@
+"""Checkout throughput with N parallel writer processes, with and without
+the SQLite tuning in db_engine.py.
+
+    python bench/checkout_benchmark.py [--writers 8] [--readers 2] [--seconds 10] [--sales 20000]
+
+Each writer is a separate process, like a gunicorn worker, running
+checkouts as fast as it can: three /api/add_to_cart calls and a /new_sale.
+Readers load the dashboard and sales list meanwhile. "before" runs with the
+sqlite3 module defaults (rollback journal, synchronous=FULL, 5s timeout),
+"after" with SQLITE_TUNING on.
+Runs against a throwaway SQLite database, never stock_sale.db.
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_app(database, tuned):
+    os.environ['DATABASE_URL'] = 'sqlite:///' + database
+    os.environ['SQLITE_TUNING'] = '1' if tuned else '0'
+    os.environ['ACCESS_LOG'] = '0'
+    sys.path.insert(0, ROOT)
+    os.chdir(ROOT)
+    from app import app
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = 1
+        session['username'] = 'admin'
+        session['role'] = 'admin'
+    return app, client
+
+
+def writer(database, tuned, seconds, barrier, results, seed):
+    app, client = load_app(database, tuned)
+    from app import Item
+    with app.app_context():
+        items = [{'item_id': item.id, 'unit': item.unit, 'quantity': 1,
+                  'purchase_price': item.purchase_price, 'sale_price': item.sale_price}
+                 for item in Item.query.filter(Item.quantity >= 1000).limit(500)]
+    rng = random.Random(seed)
+
+    ok, failed, timings, error = 0, 0, [], None
+    barrier.wait()
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        lines = rng.sample(items, 3)
+        total = sum(line['sale_price'] for line in lines)
+        start = time.perf_counter()
+        # Build the cart server-side (each add reads, then writes), then check out
+        responses = [client.post('/api/add_to_cart', json={'item_id': line['item_id'], 'quantity': 1})
+                     for line in lines]
+        responses.append(client.post('/new_sale', json={
+            'customer_id': None, 'payment_method': 'Cash',
+            'received_amount': total, 'cash_amount': total, 'items': lines
+        }))
+        timings.append((time.perf_counter() - start) * 1000)
+        failures = [response for response in responses
+                    if response.status_code != 200 or not response.get_json()['success']]
+        if failures:
+            failed += 1
+            error = error or failures[0].get_json().get('message')
+        else:
+            ok += 1
+    results.put(('writer', ok, failed, timings, error))
+
+
+def reader(database, tuned, seconds, barrier, results, seed):
+    app, client = load_app(database, tuned)
+    ok, failed, timings = 0, 0, []
+    barrier.wait()
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        for path in ('/dashboard', '/sales'):
+            start = time.perf_counter()
+            response = client.get(path)
+            timings.append((time.perf_counter() - start) * 1000)
+            if response.status_code == 200:
+                ok += 1
+            else:
+                failed += 1
+    results.put(('reader', ok, failed, timings, None))
+
+
+def run(database, tuned, args):
+    ctx = multiprocessing.get_context('spawn')
+    barrier = ctx.Barrier(args.writers + args.readers)
+    results = ctx.Queue()
+    processes = [ctx.Process(target=writer, args=(database, tuned, args.seconds, barrier, results, i))
+                 for i in range(args.writers)]
+    processes += [ctx.Process(target=reader, args=(database, tuned, args.seconds, barrier, results, i))
+                  for i in range(args.readers)]
+    for process in processes:
+        process.start()
+    collected = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    summary = {}
+    for role in ('writer', 'reader'):
+        rows = [row for row in collected if row[0] == role]
+        timings = sorted(t for row in rows for t in row[3])
+        summary[role] = {
+            'ok': sum(row[1] for row in rows),
+            'failed': sum(row[2] for row in rows),
+            'p50': statistics.median(timings) if timings else 0.0,
+            'p95': timings[int(len(timings) * 0.95)] if timings else 0.0,
+            'error': next((row[4] for row in rows if row[4]), None),
+        }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--writers', type=int, default=8)
+    parser.add_argument('--readers', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--sales', type=int, default=20000)
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix='stock-bench-')
+    seeded = os.path.join(tmpdir, 'seeded.db')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + seeded
+    sys.path.insert(0, ROOT)
+    from app import app, db, Item
+    from bench.seed import seed_database
+
+    with app.app_context():
+        print(f'Seeding {args.sales} sales into {tmpdir} ...')
+        seed_database({'sales': args.sales})
+        # Enough stock that no checkout is refused during the run
+        Item.query.update({'quantity': 10 ** 6})
+        db.session.commit()
+        db.engine.dispose()
+    # Back to a single self-contained file, as an untuned database would be
+    with sqlite3.connect(seeded) as conn:
+        conn.execute('PRAGMA journal_mode = DELETE')
+
+    results = {}
+    for label, tuned in (('before', False), ('after', True)):
+        database = os.path.join(tmpdir, f'{label}.db')
+        shutil.copy(seeded, database)
+        print(f'Running {label} ({args.writers} writers, {args.readers} readers, {args.seconds:g}s) ...')
+        results[label] = run(database, tuned, args)
+
+    print(f"\n{'run':<8} {'checkouts/s':>12} {'failed':>7} {'p50 ms':>8} {'p95 ms':>8}"
+          f" {'reads/s':>9} {'failed':>7} {'p50 ms':>8} {'p95 ms':>8}")
+    for label, summary in results.items():
+        w, r = summary['writer'], summary['reader']
+        print(f"{label:<8} {w['ok'] / args.seconds:>12.1f} {w['failed']:>7} {w['p50']:>8.1f} {w['p95']:>8.1f}"
+              f" {r['ok'] / args.seconds:>9.1f} {r['failed']:>7} {r['p50']:>8.1f} {r['p95']:>8.1f}")
+    for label, summary in results.items():
+        if summary['writer']['error']:
+            print(f"{label}: first checkout failure: {summary['writer']['error']}")
+
+
+if __name__ == '__main__':
+    main()
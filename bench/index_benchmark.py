@@ -0,0 +1,88 @@
+"""Time the dashboard, customer ledger and sales report with and without the
+indexes from migrations/versions/0001_hot_query_indexes.py.
+
+    python bench/index_benchmark.py [--sales 50000] [--repeat 20]
+
+Runs against a throwaway SQLite database, never stock_sale.db.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def time_endpoints(client, paths, repeat):
+    results = {}
+    for path in paths:
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            response = client.get(path)
+            timings.append((time.perf_counter() - start) * 1000)
+            assert response.status_code == 200, (path, response.status_code)
+        results[path] = statistics.median(timings)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sales', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix='stock-bench-')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tmpdir, 'bench.db')
+    sys.path.insert(0, ROOT)
+    from app import app, db, Sale
+    from bench.seed import seed_database
+
+    with app.app_context():
+        print(f'Seeding {args.sales} sales into {tmpdir} ...')
+        seed_database({'sales': args.sales})
+        indexes = [index for table in db.metadata.sorted_tables for index in table.indexes]
+        # The busiest credit customer makes the worst-case ledger
+        customer_id = db.session.query(Sale.customer_id)\
+            .filter(Sale.customer_id.isnot(None))\
+            .group_by(Sale.customer_id)\
+            .order_by(db.func.count().desc()).limit(1).scalar()
+        engine = db.engine
+
+    start = (date.today() - timedelta(days=90)).isoformat()
+    paths = [
+        '/dashboard',
+        f'/customers/{customer_id}',
+        f'/customers/{customer_id}/ledger',
+        f'/reports/sales?start_date={start}&end_date={date.today().isoformat()}',
+        '/suppliers/1/statement',
+    ]
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = 1
+        session['username'] = 'admin'
+        session['role'] = 'admin'
+
+    for index in indexes:
+        index.drop(engine)
+    with engine.begin() as conn:
+        conn.execute(db.text('ANALYZE'))
+    before = time_endpoints(client, paths, args.repeat)
+
+    for index in indexes:
+        index.create(engine)
+    with engine.begin() as conn:
+        conn.execute(db.text('ANALYZE'))
+    after = time_endpoints(client, paths, args.repeat)
+
+    print(f"\n{'endpoint':<60} {'before ms':>10} {'after ms':>10}")
+    for path in paths:
+        print(f'{path:<60} {before[path]:>10.2f} {after[path]:>10.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+"""Load benchmark over the main pages, driven through the Flask test client.
+
+Used by `flask --app app bench run`. Reports p50/p95/p99 latency and SQL
+statements per request for each endpoint, and can save the results as JSON
+to compare against another commit with --compare.
+"""
+import json
+import math
+import random
+import subprocess
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import event
+
+
+def percentile(values, pct):
+    # Nearest-rank percentile of an already sorted list
+    if not values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(values)))
+    return values[rank - 1]
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def build_requests(rng):
+    """Return [(name, method, path, json_body_factory)] for the current database."""
+    from app import db, Customer, Item, Sale, Supplier
+
+    # The busiest credit customer and supplier are the expensive pages
+    customer_id = db.session.query(Sale.customer_id)\
+        .filter(Sale.customer_id.isnot(None))\
+        .group_by(Sale.customer_id)\
+        .order_by(db.func.count().desc()).limit(1).scalar()
+    if customer_id is None:
+        customer_id = db.session.query(db.func.min(Customer.id)).scalar()
+    supplier_id = db.session.query(db.func.min(Supplier.id)).scalar()
+    items = Item.query.filter(Item.quantity >= 100).limit(500).all()
+    cart_items = [
+        {'item_id': item.id, 'unit': item.unit,
+         'purchase_price': item.purchase_price, 'sale_price': item.sale_price}
+        for item in items
+    ]
+
+    def new_sale_body():
+        lines = [dict(line, quantity=1) for line in rng.sample(cart_items, min(3, len(cart_items)))]
+        total = sum(line['sale_price'] for line in lines)
+        return {'customer_id': None, 'payment_method': 'Cash',
+                'received_amount': total, 'cash_amount': total, 'items': lines}
+
+    end = date.today()
+    start = end - timedelta(days=90)
+    requests = [
+        ('dashboard', 'GET', '/dashboard', None),
+        ('customers', 'GET', '/customers', None),
+    ]
+    if customer_id is not None:
+        requests.append(('view_customer', 'GET', f'/customers/{customer_id}', None))
+    requests.append(('sales_report', 'GET', f'/reports/sales?start_date={start}&end_date={end}', None))
+    if cart_items:
+        requests.append(('new_sale', 'POST', '/new_sale', new_sale_body))
+    if supplier_id is not None:
+        requests.append(('supplier_statement', 'GET', f'/suppliers/{supplier_id}/statement', None))
+    return requests
+
+
+def run_benchmark(app, iterations=50, warmup=3, seed=1):
+    from app import db, User
+
+    rng = random.Random(seed)
+    with app.app_context():
+        requests = build_requests(rng)
+        admin = User.query.filter_by(role='admin').first()
+        engine = db.engine
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = admin.id
+        session['username'] = admin.username
+        session['role'] = admin.role
+
+    statements = []
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', count_statement)
+    results = {}
+    try:
+        for name, method, path, body in requests:
+            timings, sql_counts = [], []
+            for i in range(warmup + iterations):
+                statements.clear()
+                start = time.perf_counter()
+                response = client.open(path, method=method, json=body() if body else None)
+                elapsed = (time.perf_counter() - start) * 1000
+                if response.status_code != 200:
+                    raise RuntimeError(f'{method} {path} returned {response.status_code}')
+                if i >= warmup:
+                    timings.append(elapsed)
+                    sql_counts.append(len(statements))
+            timings.sort()
+            results[name] = {
+                'method': method,
+                'path': path,
+                'requests': iterations,
+                'p50_ms': round(percentile(timings, 50), 3),
+                'p95_ms': round(percentile(timings, 95), 3),
+                'p99_ms': round(percentile(timings, 99), 3),
+                'mean_ms': round(sum(timings) / len(timings), 3),
+                'sql_statements': max(sql_counts),
+            }
+    finally:
+        event.remove(engine, 'before_cursor_execute', count_statement)
+
+    return {
+        'revision': git_revision(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'database': app.config['SQLALCHEMY_DATABASE_URI'],
+        'iterations': iterations,
+        'endpoints': results,
+    }
+
+
+def format_results(results, baseline=None):
+    lines = [f"{'endpoint':<20} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'sql':>5}"]
+    for name, row in results['endpoints'].items():
+        line = f"{name:<20} {row['p50_ms']:>9.2f} {row['p95_ms']:>9.2f} {row['p99_ms']:>9.2f} {row['sql_statements']:>5}"
+        old = (baseline or {}).get('endpoints', {}).get(name)
+        if old:
+            change = (row['p50_ms'] - old['p50_ms']) / old['p50_ms'] * 100 if old['p50_ms'] else 0
+            line += f"   p50 {change:+.1f}%, sql {row['sql_statements'] - old['sql_statements']:+d} vs {baseline.get('revision')}"
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_results(results, path):
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
@@ -0,0 +1,151 @@
+"""Synthetic data for load testing.
+
+Used by `flask --app app bench seed` and the scripts in this directory.
+Inserts go through Core executemany in batches, so a few hundred thousand
+sale lines take seconds rather than minutes.
+"""
+import random
+from datetime import date, timedelta
+
+BATCH_SIZE = 10000
+
+DEFAULT_COUNTS = {
+    'items': 2000,
+    'customers': 4000,
+    'suppliers': 50,
+    'sales': 50000,
+    'lines_per_sale': 3,
+    'payments': 10000,
+    'supplier_transactions': 10000,
+    'days': 730,
+}
+
+UNITS = ['pcs', 'kg', 'ltr', 'box']
+
+
+def _insert(db, model, rows):
+    conn = db.session.connection()
+    for start in range(0, len(rows), BATCH_SIZE):
+        conn.execute(db.insert(model), rows[start:start + BATCH_SIZE])
+
+
+def seed_database(counts=None, seed=42):
+    """Fill the current app database with random but consistent data.
+
+    Must run inside an app context on a database without sales. Returns the
+    counts that were used.
+    """
+    from app import (db, Item, Customer, Supplier, SupplierTransaction, Sale,
+                     SaleItem, Payment, BillSequence, rebuild_customer_balances,
+                     rebuild_daily_summary, mark_items_changed)
+
+    counts = dict(DEFAULT_COUNTS, **(counts or {}))
+    if db.session.query(Sale.id).first() is not None:
+        raise RuntimeError('Database already has sales; seed an empty database instead')
+
+    rng = random.Random(seed)
+    today = date.today()
+
+    def random_day():
+        return today - timedelta(days=rng.randint(0, counts['days']))
+
+    supplier_start = (db.session.query(db.func.max(Supplier.id)).scalar() or 0) + 1
+    _insert(db, Supplier, [
+        {'name': f'Supplier {i:04d}', 'mobile': f'8{i:09d}', 'gstin': f'27AAAAA{i:04d}A1Z5',
+         'address': f'{i} Market Road', 'balance': 0.0, 'date_added': random_day()}
+        for i in range(counts['suppliers'])
+    ])
+    supplier_ids = list(range(supplier_start, supplier_start + counts['suppliers']))
+
+    item_start = (db.session.query(db.func.max(Item.id)).scalar() or 0) + 1
+    prices = []
+    item_rows = []
+    for i in range(counts['items']):
+        purchase_price = round(rng.uniform(5, 2000), 2)
+        sale_price = round(purchase_price * rng.uniform(1.05, 1.4), 2)
+        prices.append((purchase_price, sale_price))
+        item_rows.append({
+            'name': f'Item {i:05d}', 'quantity': float(rng.randint(0, 1000)),
+            'unit': rng.choice(UNITS), 'purchase_price': purchase_price,
+            'sale_price': sale_price, 'date_added': random_day(),
+            'supplier_id': rng.choice(supplier_ids) if supplier_ids else None,
+        })
+    _insert(db, Item, item_rows)
+
+    customer_start = (db.session.query(db.func.max(Customer.id)).scalar() or 0) + 1
+    _insert(db, Customer, [
+        {'name': f'Customer {i:05d}', 'mobile': f'9{i:09d}', 'address': f'{i} Station Road',
+         'balance': 0.0, 'date_added': random_day()}
+        for i in range(counts['customers'])
+    ])
+    customer_ids = list(range(customer_start, customer_start + counts['customers']))
+
+    # Sales in date order with per-day bill sequences, like new_sale produces
+    sale_days = sorted(random_day() for _ in range(counts['sales']))
+    sequences = {}
+    sales, lines = [], []
+    sale_start = (db.session.query(db.func.max(Sale.id)).scalar() or 0) + 1
+    for offset, day in enumerate(sale_days):
+        sale_id = sale_start + offset
+        key = day.strftime('%Y%m%d')
+        sequences[key] = sequences.get(key, 0) + 1
+
+        total = profit = 0.0
+        for _ in range(counts['lines_per_sale']):
+            index = rng.randrange(counts['items'])
+            purchase_price, sale_price = prices[index]
+            quantity = float(rng.randint(1, 10))
+            total += sale_price * quantity
+            profit += (sale_price - purchase_price) * quantity
+            lines.append({
+                'sale_id': sale_id, 'item_id': item_start + index, 'quantity': quantity,
+                'unit': item_rows[index]['unit'], 'purchase_price': purchase_price,
+                'sale_price': sale_price, 'profit': (sale_price - purchase_price) * quantity,
+            })
+
+        customer_id = rng.choice(customer_ids) if customer_ids and rng.random() < 0.6 else None
+        received = total if customer_id is None or rng.random() < 0.6 else round(total * rng.random(), 2)
+        method = rng.choice(['Cash', 'Online', 'Split'])
+        cash = received if method == 'Cash' else (0.0 if method == 'Online' else round(received / 2, 2))
+        sales.append({
+            'id': sale_id, 'bill_number': f'{key}-{sequences[key]:04d}',
+            'customer_id': customer_id, 'sale_date': day,
+            'sale_time': f'{rng.randint(8, 21):02d}:{rng.randint(0, 59):02d}:00',
+            'total_amount': total, 'received_amount': received,
+            'due_amount': max(0, total - received), 'total_profit': profit,
+            'payment_method': method, 'cash_amount': cash, 'online_amount': received - cash,
+        })
+    _insert(db, Sale, sales)
+    _insert(db, SaleItem, lines)
+    _insert(db, BillSequence, [{'day': key, 'last_value': value} for key, value in sequences.items()])
+
+    if customer_ids:
+        _insert(db, Payment, [
+            {'customer_id': rng.choice(customer_ids), 'amount': round(rng.uniform(50, 2000), 2),
+             'payment_date': random_day(), 'description': rng.choice(['', 'Cash', 'UPI'])}
+            for _ in range(counts['payments'])
+        ])
+    if supplier_ids:
+        _insert(db, SupplierTransaction, [
+            {'supplier_id': rng.choice(supplier_ids), 'date': random_day(),
+             'bill_no': f'P{i:06d}', 'amount': round(rng.uniform(500, 50000), 2),
+             'transaction_type': rng.choice(['purchase', 'payment'])}
+            for i in range(counts['supplier_transactions'])
+        ])
+
+    # Stored balances and rollups, as the routes would have left them
+    signed = db.case(
+        (SupplierTransaction.transaction_type == 'purchase', SupplierTransaction.amount),
+        else_=-SupplierTransaction.amount
+    )
+    db.session.execute(db.update(Supplier).values(balance=db.func.coalesce(
+        db.select(db.func.sum(signed))
+        .where(SupplierTransaction.supplier_id == Supplier.id)
+        .scalar_subquery(), 0.0
+    )))
+    db.session.commit()
+    rebuild_customer_balances()
+    rebuild_daily_summary()
+    mark_items_changed()
+
+    return counts
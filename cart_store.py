@@ -0,0 +1,170 @@
+"""Server-side storage for in-progress sale carts.
+
+A cart is keyed by an opaque id kept in the user's session and holds its
+lines as a mapping of item_id -> line, plus a running subtotal and line
+count, so adding or removing one line never reads or rewrites the rest of
+the cart. DatabaseCartStore is used by the app; MemoryCartStore keeps the
+same behaviour in a dict for tests and single-process setups.
+"""
+from datetime import datetime, timedelta
+import threading
+
+# Carts untouched for this long are dropped by `flask prune-carts`
+CART_MAX_AGE = timedelta(days=2)
+
+
+def _line(item_id, name, quantity, unit, purchase_price, sale_price):
+    return {
+        'item_id': item_id,
+        'id': item_id,
+        'name': name,
+        'quantity': quantity,
+        'unit': unit,
+        'purchase_price': purchase_price,
+        'sale_price': sale_price,
+        'price': sale_price
+    }
+
+
+class MemoryCartStore:
+    def __init__(self):
+        self.carts = {}  # cart_id -> {'lines': {item_id: line}, 'subtotal': float, 'updated_at': datetime}
+        self.lock = threading.Lock()
+
+    def _cart(self, cart_id):
+        return self.carts.setdefault(cart_id, {'lines': {}, 'subtotal': 0.0, 'updated_at': datetime.now()})
+
+    def lines(self, cart_id):
+        cart = self.carts.get(cart_id)
+        return dict(cart['lines']) if cart else {}
+
+    def quantity(self, cart_id, item_id):
+        line = self.carts.get(cart_id, {}).get('lines', {}).get(item_id)
+        return line['quantity'] if line else 0
+
+    def summary(self, cart_id):
+        cart = self.carts.get(cart_id)
+        return (len(cart['lines']), cart['subtotal']) if cart else (0, 0.0)
+
+    def add(self, cart_id, item, quantity):
+        with self.lock:
+            cart = self._cart(cart_id)
+            line = cart['lines'].get(item.id)
+            if line is None:
+                line = cart['lines'][item.id] = _line(
+                    item.id, item.name, 0, item.unit, item.purchase_price, item.sale_price
+                )
+            line['quantity'] += quantity
+            delta = quantity * line['sale_price']
+            cart['subtotal'] += delta
+            cart['updated_at'] = datetime.now()
+            return dict(line), delta
+
+    def remove(self, cart_id, item_id):
+        with self.lock:
+            cart = self.carts.get(cart_id)
+            line = cart['lines'].pop(item_id, None) if cart else None
+            if line is None:
+                return None, 0.0
+            delta = -line['quantity'] * line['sale_price']
+            cart['subtotal'] += delta
+            cart['updated_at'] = datetime.now()
+            return line, delta
+
+    def clear(self, cart_id):
+        with self.lock:
+            self.carts.pop(cart_id, None)
+
+    def prune(self, max_age):
+        cutoff = datetime.now() - max_age
+        with self.lock:
+            stale = [cart_id for cart_id, cart in self.carts.items() if cart['updated_at'] < cutoff]
+            for cart_id in stale:
+                del self.carts[cart_id]
+        return len(stale)
+
+
+class DatabaseCartStore:
+    """Carts in the cart / cart_line tables (models passed in from app.py).
+
+    The subtotal and line count live on the cart row and are changed with
+    in-SQL increments, like the stored customer balance.
+    """
+
+    def __init__(self, db, cart_model, line_model):
+        self.db = db
+        self.Cart = cart_model
+        self.CartLine = line_model
+
+    def _as_dict(self, line):
+        return _line(line.item_id, line.name, line.quantity, line.unit,
+                     line.purchase_price, line.sale_price)
+
+    def lines(self, cart_id):
+        rows = self.CartLine.query.filter_by(cart_id=cart_id).order_by(self.CartLine.added_at)
+        return {line.item_id: self._as_dict(line) for line in rows}
+
+    def quantity(self, cart_id, item_id):
+        line = self.db.session.get(self.CartLine, (cart_id, item_id))
+        return line.quantity if line else 0
+
+    def summary(self, cart_id):
+        cart = self.db.session.get(self.Cart, cart_id)
+        return (cart.line_count, cart.subtotal) if cart else (0, 0.0)
+
+    def _adjust(self, cart_id, lines, delta):
+        db, Cart = self.db, self.Cart
+        now = datetime.now()
+        updated = db.session.execute(
+            db.update(Cart).where(Cart.id == cart_id).values(
+                line_count=Cart.line_count + lines, subtotal=Cart.subtotal + delta, updated_at=now
+            )
+        ).rowcount
+        if not updated:
+            db.session.add(Cart(id=cart_id, line_count=lines, subtotal=delta, updated_at=now))
+
+    def add(self, cart_id, item, quantity):
+        db = self.db
+        line = db.session.get(self.CartLine, (cart_id, item.id))
+        new_line = line is None
+        delta = quantity * (item.sale_price if new_line else line.sale_price)
+        # The cart row first: its lines reference it
+        self._adjust(cart_id, 1 if new_line else 0, delta)
+        if new_line:
+            line = self.CartLine(
+                cart_id=cart_id, item_id=item.id, name=item.name, quantity=quantity,
+                unit=item.unit, purchase_price=item.purchase_price, sale_price=item.sale_price,
+                added_at=datetime.now()
+            )
+            db.session.add(line)
+        else:
+            line.quantity = self.CartLine.quantity + quantity
+        db.session.commit()
+        return self._as_dict(line), delta
+
+    def remove(self, cart_id, item_id):
+        db = self.db
+        line = db.session.get(self.CartLine, (cart_id, item_id))
+        if line is None:
+            return None, 0.0
+        removed = self._as_dict(line)
+        delta = -line.quantity * line.sale_price
+        db.session.delete(line)
+        self._adjust(cart_id, -1, delta)
+        db.session.commit()
+        return removed, delta
+
+    def clear(self, cart_id):
+        db = self.db
+        db.session.execute(db.delete(self.CartLine).where(self.CartLine.cart_id == cart_id))
+        db.session.execute(db.delete(self.Cart).where(self.Cart.id == cart_id))
+        db.session.commit()
+
+    def prune(self, max_age):
+        db, Cart, CartLine = self.db, self.Cart, self.CartLine
+        stale = db.select(Cart.id).where(Cart.updated_at < datetime.now() - max_age)
+        db.session.execute(db.delete(CartLine).where(CartLine.cart_id.in_(stale)))
+        count = db.session.execute(db.delete(Cart).where(Cart.id.in_(stale))).rowcount
+        db.session.commit()
+        return count
+
@@ -0,0 +1,58 @@
+"""Engine settings per database backend.
+
+engine_options() picks the pool settings for SQLALCHEMY_ENGINE_OPTIONS from
+the database URL. For SQLite, init_sqlite_tuning() sets the connection
+pragmas on every new connection: WAL journal, so readers never block the
+writer or wait for it; synchronous=NORMAL, which under WAL syncs only at
+checkpoints; a busy timeout so concurrent writers queue for the write lock
+instead of failing with "database is locked"; page cache and mmap sizes
+for reads; and foreign key enforcement. The page cache is per connection,
+so SQLite gets its own, smaller pool limits than server databases.
+"""
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+
+def engine_options(uri, config):
+    url = make_url(uri)
+    if url.get_backend_name() == 'sqlite':
+        if not url.database or url.database == ':memory:':
+            return {}  # Flask-SQLAlchemy sets up a shared StaticPool
+        # One connection per thread; a sync gunicorn worker needs just one.
+        # Kept small since every connection holds its own page cache.
+        return {'pool_size': config['SQLITE_POOL_SIZE'], 'max_overflow': config['SQLITE_MAX_OVERFLOW'],
+                'pool_timeout': 30}
+    # Server databases drop idle connections, so check and recycle them
+    return {'pool_size': config['DB_POOL_SIZE'], 'max_overflow': config['DB_MAX_OVERFLOW'],
+            'pool_pre_ping': True, 'pool_recycle': 1800}
+
+
+def sqlite_pragmas(config, in_memory=False):
+    # busy_timeout first, so switching the journal mode waits out other writers too
+    pragmas = [
+        ('busy_timeout', int(config['SQLITE_BUSY_TIMEOUT_MS'])),
+        ('synchronous', config['SQLITE_SYNCHRONOUS']),
+        ('cache_size', -int(config['SQLITE_CACHE_SIZE_KB'])),  # negative = KiB
+        ('mmap_size', int(config['SQLITE_MMAP_SIZE'])),
+        ('foreign_keys', 'ON' if config['SQLITE_FOREIGN_KEYS'] else 'OFF'),
+    ]
+    if not in_memory:
+        pragmas.insert(1, ('journal_mode', config['SQLITE_JOURNAL_MODE']))
+    return pragmas
+
+
+def init_sqlite_tuning(app, db):
+    """Apply the SQLite pragmas to every new connection of db.engine."""
+    with app.app_context():
+        engine = db.engine
+    if engine.dialect.name != 'sqlite' or not app.config.get('SQLITE_TUNING'):
+        return
+    database = engine.url.database
+    pragmas = sqlite_pragmas(app.config, in_memory=not database or database == ':memory:')
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas:
+            cursor.execute(f'PRAGMA {name} = {value}')
+        cursor.close()
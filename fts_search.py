@@ -0,0 +1,89 @@
+"""SQLite FTS5 search over customers and suppliers.
+
+Each searchable table gets an external-content FTS5 index (the text lives
+only in the base table) kept in sync by triggers. The update trigger fires
+only when an indexed column changes, so balance updates on every sale never
+touch the index. Prefix indexes of 2 and 3 characters keep typeahead-style
+prefix queries fast on large tables.
+"""
+import re
+
+# table -> (FTS table, indexed columns, bm25 weight per column)
+SEARCH_TABLES = {
+    'customer': ('customer_fts', ('name', 'mobile', 'address'), (10.0, 5.0, 1.0)),
+    'supplier': ('supplier_fts', ('name', 'mobile', 'gstin'), (10.0, 5.0, 5.0)),
+}
+
+_TOKEN = re.compile(r'\w+')
+
+
+def _ddl(table, fts, columns):
+    cols = ', '.join(columns)
+    new = ', '.join(f'new.{c}' for c in columns)
+    old = ', '.join(f'old.{c}' for c in columns)
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({cols}, content='{table}', "
+        f"content_rowid='id', tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {cols} ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old}); "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new}); END",
+    ]
+
+
+def search_index_names():
+    """FTS tables, their shadow tables and triggers (for Alembic to ignore)."""
+    names = set()
+    for fts, columns, weights in SEARCH_TABLES.values():
+        names.add(fts)
+        names.update(f'{fts}_{suffix}' for suffix in ('data', 'idx', 'docsize', 'config', 'content'))
+    return names
+
+
+def create_search_index(conn, rebuild=False):
+    """Create missing FTS tables and triggers on a SQLite connection and fill
+    new (or, with rebuild, all) indexes from their base tables."""
+    for table, (fts, columns, weights) in SEARCH_TABLES.items():
+        exists = conn.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (fts,)
+        ).first() is not None
+        for statement in _ddl(table, fts, columns):
+            conn.exec_driver_sql(statement)
+        if rebuild or not exists:
+            conn.exec_driver_sql(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+
+def drop_search_index(conn):
+    for table, (fts, columns, weights) in SEARCH_TABLES.items():
+        for suffix in ('ai', 'ad', 'au'):
+            conn.exec_driver_sql(f'DROP TRIGGER IF EXISTS {fts}_{suffix}')
+        conn.exec_driver_sql(f'DROP TABLE IF EXISTS {fts}')
+
+
+def match_expression(text, columns=None):
+    """FTS5 MATCH string for free text: every word must match as a prefix,
+    optionally only within columns. Returns None when the text has no
+    searchable words."""
+    tokens = _TOKEN.findall(text)
+    if not tokens:
+        return None
+    expression = ' '.join(f'"{token}"*' for token in tokens)
+    if columns:
+        expression = f"{{{' '.join(columns)}}} : ({expression})"
+    return expression
+
+
+def matching_ids_sql(table):
+    """SELECT of the ids matching :query, unordered."""
+    fts = SEARCH_TABLES[table][0]
+    return f"SELECT rowid AS id FROM {fts} WHERE {fts} MATCH :query"
+
+
+def ranked_ids_sql(table):
+    """SELECT of (id, score) for :query, best match first (lowest score)."""
+    fts, columns, weights = SEARCH_TABLES[table]
+    return (f"SELECT rowid AS id, bm25({fts}, {', '.join(map(str, weights))}) AS score "
+            f"FROM {fts} WHERE {fts} MATCH :query")
@@ -0,0 +1,156 @@
+"""Customer photo processing with Pillow, in content-addressed storage.
+
+An upload is decoded once, turned upright from its EXIF orientation and
+re-encoded without any metadata, as a full-size JPEG plus small WebP and JPEG
+thumbnails stored next to it:
+
+    <name>.jpg              longest side at most FULL_SIZE
+    <name>_<size>.webp      one pair per THUMBNAIL_SIZES entry
+    <name>_<size>.jpg
+
+store_photo names these by the SHA-256 of the uploaded bytes, sharded by
+its first two hex digits (ab/abcd....jpg), so the same picture uploaded
+twice is stored and encoded once. Files are never deleted while a request
+is handled; sweep_photos removes the ones no customer references anymore.
+"""
+import hashlib
+import os
+import time
+import uuid
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+FULL_SIZE = 1600
+THUMBNAIL_SIZES = {'sm': 96, 'md': 240}  # square, 2x the displayed size
+THUMBNAIL_FORMATS = ('webp', 'jpg')
+CHUNK_SIZE = 64 * 1024
+JPEG_QUALITY = 82
+WEBP_QUALITY = 80
+
+
+class InvalidImage(ValueError):
+    pass
+
+
+def thumbnail_name(filename, size, fmt):
+    stem = os.path.splitext(filename)[0]
+    return f'{stem}_{size}.{fmt}'
+
+
+def photo_variants(filename):
+    """Every file save_photo writes for filename, full size first."""
+    return [filename] + [thumbnail_name(filename, size, fmt)
+                         for size in THUMBNAIL_SIZES for fmt in THUMBNAIL_FORMATS]
+
+
+def _open(stream):
+    try:
+        image = Image.open(stream)
+        # Let the JPEG decoder downscale while decoding; multi-megapixel phone
+        # photos then never need their full resolution in memory
+        image.draft('RGB', (FULL_SIZE, FULL_SIZE))
+        image = ImageOps.exif_transpose(image)
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError) as e:
+        raise InvalidImage(f'Not a readable image: {e}')
+
+    # JPEG has no alpha channel: flatten transparent PNG/GIF onto white
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def _save(image, path, fmt):
+    # Write under a temporary name so a half-written file is never served
+    tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+    if fmt == 'webp':
+        image.save(tmp_path, 'WEBP', quality=WEBP_QUALITY, method=4)
+    else:
+        image.save(tmp_path, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    os.replace(tmp_path, path)
+
+
+def save_photo(stream, directory, name):
+    """Decode an uploaded image and write <name>.jpg and its thumbnails to
+    directory. Returns the full-size filename; raises InvalidImage."""
+    image = _open(stream)
+    filename = f'{name}.jpg'
+
+    full = image.copy()
+    full.thumbnail((FULL_SIZE, FULL_SIZE), Image.LANCZOS)
+    _save(full, os.path.join(directory, filename), 'jpg')
+
+    for size, pixels in THUMBNAIL_SIZES.items():
+        thumbnail = ImageOps.fit(image, (pixels, pixels), Image.LANCZOS)
+        for fmt in THUMBNAIL_FORMATS:
+            _save(thumbnail, os.path.join(directory, thumbnail_name(filename, size, fmt)), fmt)
+
+    return filename
+
+
+def store_photo(stream, directory):
+    """Store an upload under its content hash and return its filename
+    relative to directory (ab/<sha256>.jpg). Raises InvalidImage."""
+    # Spool to disk in chunks while hashing, so large uploads never sit in
+    # memory as one bytes object
+    spool_path = os.path.join(directory, f'{uuid.uuid4().hex}.upload.tmp')
+    digest = hashlib.sha256()
+    try:
+        with open(spool_path, 'wb') as spool:
+            for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+                spool.write(chunk)
+
+        name = digest.hexdigest()
+        shard = os.path.join(directory, name[:2])
+        filename = f'{name}.jpg'
+        variants = [os.path.join(shard, variant) for variant in photo_variants(filename)]
+        if all(os.path.exists(path) for path in variants):
+            # Already stored: refresh the mtimes so a running sweep treats
+            # the files as in use
+            for path in variants:
+                os.utime(path)
+        else:
+            os.makedirs(shard, exist_ok=True)
+            with open(spool_path, 'rb') as spool:
+                save_photo(spool, shard, name)
+    finally:
+        os.remove(spool_path)
+
+    return f'{name[:2]}/{filename}'
+
+
+def sweep_photos(directory, referenced, min_age=3600, dry_run=False):
+    """Delete files under directory that are not a variant of any filename in
+    referenced (paths relative to directory). Files younger than min_age
+    seconds are left alone, since their customer row may not be committed
+    yet. Returns (files, bytes) removed, or that would be with dry_run."""
+    keep = {os.path.normpath(variant) for filename in referenced
+            for variant in photo_variants(filename)}
+    cutoff = time.time() - min_age
+    files = reclaimed = 0
+
+    for root, dirs, names in os.walk(directory):
+        for name in names:
+            path = os.path.join(root, name)
+            if os.path.relpath(path, directory) in keep:
+                continue
+            try:
+                stat = os.stat(path)
+                if stat.st_mtime > cutoff:
+                    continue
+                if not dry_run:
+                    os.remove(path)
+            except FileNotFoundError:
+                continue
+            files += 1
+            reclaimed += stat.st_size
+
+    if not dry_run:
+        for root, dirs, names in os.walk(directory, topdown=False):
+            if root != directory and not os.listdir(root):
+                os.rmdir(root)
+
+    return files, reclaimed
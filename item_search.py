@@ -0,0 +1,127 @@
+"""In-memory name index for item typeahead search.
+
+Holds only (id, name) pairs; stock and prices change with every sale, so
+callers look those up in the database for the few ids a search returns.
+Every query term must match the start of a word in the name, or (for terms
+of three or more characters) anywhere in it through a trigram index. Results
+are ranked: name starts with the query, then all terms are word prefixes,
+then substring matches; shorter names first within each rank.
+"""
+import bisect
+import heapq
+import re
+import threading
+
+_WORD = re.compile(r'\w+')
+
+
+def _normalize(text):
+    return ' '.join(_WORD.findall(text.casefold()))
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class ItemIndex:
+    def __init__(self, rows=()):
+        self.names = {}     # id -> normalized name
+        self.postings = {}  # word -> set of ids
+        self.trigrams = {}  # trigram -> set of ids
+        for item_id, name in rows:
+            normalized = _normalize(name or '')
+            self.names[item_id] = normalized
+            for word in normalized.split():
+                self.postings.setdefault(word, set()).add(item_id)
+            for trigram in _trigrams(normalized):
+                self.trigrams.setdefault(trigram, set()).add(item_id)
+        self.words = sorted(self.postings)
+        self.sort_keys = {item_id: (len(name), name, item_id) for item_id, name in self.names.items()}
+        self.by_name = sorted(self.names, key=lambda item_id: (self.names[item_id], item_id))
+        self.sorted_names = [self.names[item_id] for item_id in self.by_name]
+
+    def _word_prefix(self, term):
+        # Distinct words are far fewer than items, so walk those from the
+        # first one >= term and union their postings
+        ids = set()
+        for position in range(bisect.bisect_left(self.words, term), len(self.words)):
+            word = self.words[position]
+            if not word.startswith(term):
+                break
+            ids |= self.postings[word]
+        return ids
+
+    def _substring(self, term):
+        sets = sorted((self.trigrams.get(t, set()) for t in _trigrams(term)), key=len)
+        if not sets or not sets[0]:
+            return set()
+        candidates = sets[0].intersection(*sets[1:])
+        return {item_id for item_id in candidates if term in self.names[item_id]}
+
+    def search(self, query, limit=20):
+        """Ranked item ids matching query; all ids by name when it is empty.
+        limit=None returns every match."""
+        query = _normalize(query)
+        if not query:
+            return self.by_name[:limit]
+
+        terms = query.split()
+        prefix_ids = None
+        for term in terms:
+            prefixed = self._word_prefix(term)
+            prefix_ids = prefixed if prefix_ids is None else prefix_ids & prefixed
+
+        # Substring matches rank last, so skip them when word-prefix matches
+        # already fill the page
+        if limit is not None and len(prefix_ids) >= limit:
+            matched = prefix_ids
+        else:
+            matched = None
+            for term in terms:
+                found = self._word_prefix(term)
+                if len(term) >= 3:
+                    found |= self._substring(term)
+                matched = found if matched is None else matched & found
+                if not matched:
+                    return []
+
+        # Names starting with the whole query are a contiguous run of the
+        # sorted names. Take the best of each rank in turn, sorting only as
+        # many as needed.
+        low = bisect.bisect_left(self.sorted_names, query)
+        high = bisect.bisect_left(self.sorted_names, query + '\U0010ffff')
+        starts = self.by_name[low:high]
+        results = []
+        for bucket in (starts, lambda: prefix_ids.difference(starts), lambda: matched - prefix_ids):
+            if callable(bucket):
+                bucket = bucket()
+            if limit is None:
+                results.extend(sorted(bucket, key=self.sort_keys.__getitem__))
+                continue
+            results.extend(heapq.nsmallest(limit - len(results), bucket, key=self.sort_keys.__getitem__))
+            if len(results) >= limit:
+                break
+        return results
+
+class ItemSearch:
+    """Process-wide ItemIndex, rebuilt lazily whenever the version returned
+    by version() changes (see mark_items_changed in app.py)."""
+
+    def __init__(self, load_rows, version):
+        self.load_rows = load_rows
+        self.version = version
+        self.index = None
+        self.built_version = None
+        self.lock = threading.Lock()
+
+    def current(self):
+        version = self.version()
+        if self.index is None or version != self.built_version:
+            with self.lock:
+                if self.index is None or version != self.built_version:
+                    self.index = ItemIndex(self.load_rows())
+                    self.built_version = version
+        return self.index
+
+    def search(self, query, limit=20):
+        return self.current().search(query, limit)
@@ -0,0 +1,56 @@
+from logging.config import fileConfig
+
+from alembic import context
+
+from app import app, db
+from fts_search import search_index_names
+
+config = context.config
+
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+# Autogenerate compares against the Flask-SQLAlchemy models
+target_metadata = db.metadata
+
+# The FTS5 search tables are managed by fts_search, not the models
+SEARCH_INDEX_NAMES = search_index_names()
+
+
+def include_name(name, type_, parent_names):
+    return not (type_ == 'table' and name in SEARCH_INDEX_NAMES)
+
+
+def run_migrations_offline():
+    context.configure(
+        url=app.config['SQLALCHEMY_DATABASE_URI'],
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={'paramstyle': 'named'},
+        render_as_batch=True,
+        include_name=include_name,
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    with app.app_context():
+        with db.engine.connect() as connection:
+            context.configure(
+                connection=connection,
+                target_metadata=target_metadata,
+                # SQLite can't ALTER most things in place
+                render_as_batch=True,
+                include_name=include_name,
+            )
+
+            with context.begin_transaction():
+                context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,43 @@
+"""Indexes for the hot query columns
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+
+Tables are created by db.create_all() for a new database, which also
+creates these indexes, so this revision only adds the indexes that older
+databases are missing.
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_item_name', 'item', ['name']),
+    ('ix_item_quantity', 'item', ['quantity']),
+    ('ix_item_supplier_id', 'item', ['supplier_id']),
+    ('ix_customer_name', 'customer', ['name']),
+    ('ix_customer_date_added', 'customer', ['date_added']),
+    ('ix_supplier_transaction_supplier_date', 'supplier_transaction', ['supplier_id', 'date', 'id']),
+    ('ix_sale_sale_date', 'sale', ['sale_date', 'id']),
+    ('ix_sale_customer_date', 'sale', ['customer_id', 'sale_date']),
+    ('ix_sale_item_sale_id', 'sale_item', ['sale_id']),
+    ('ix_sale_item_item_id', 'sale_item', ['item_id']),
+    ('ix_payment_customer_date', 'payment', ['customer_id', 'payment_date']),
+]
+
+
+def upgrade():
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, if_not_exists=True)
+    op.execute('ANALYZE')
+
+
+def downgrade():
+    for name, table, columns in reversed(INDEXES):
+        op.drop_index(name, table_name=table, if_exists=True)
@@ -0,0 +1,31 @@
+"""FTS5 search index for customers and suppliers
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+
+SQLite only; the tables and triggers are defined in fts_search.py, which
+create_schema() also uses for a new database.
+"""
+from alembic import op
+
+from fts_search import create_search_index, drop_search_index
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    conn = op.get_bind()
+    if conn.dialect.name == 'sqlite':
+        create_search_index(conn)
+
+
+def downgrade():
+    conn = op.get_bind()
+    if conn.dialect.name == 'sqlite':
+        drop_search_index(conn)
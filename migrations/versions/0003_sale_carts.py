@@ -0,0 +1,49 @@
+"""Server-side sale carts
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+
+db.create_all() creates these tables for a new database as well, so each is
+only created here when it is missing.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    tables = sa.inspect(op.get_bind()).get_table_names()
+    if 'cart' not in tables:
+        op.create_table(
+            'cart',
+            sa.Column('id', sa.String(length=32), primary_key=True),
+            sa.Column('subtotal', sa.Float(), nullable=False),
+            sa.Column('line_count', sa.Integer(), nullable=False),
+            sa.Column('updated_at', sa.DateTime(), nullable=False),
+        )
+        op.create_index('ix_cart_updated_at', 'cart', ['updated_at'])
+    if 'cart_line' not in tables:
+        op.create_table(
+            'cart_line',
+            sa.Column('cart_id', sa.String(length=32), sa.ForeignKey('cart.id'), primary_key=True),
+            sa.Column('item_id', sa.Integer(), primary_key=True),
+            sa.Column('name', sa.String(length=100), nullable=False),
+            sa.Column('quantity', sa.Float(), nullable=False),
+            sa.Column('unit', sa.String(length=20), nullable=False),
+            sa.Column('purchase_price', sa.Float(), nullable=False),
+            sa.Column('sale_price', sa.Float(), nullable=False),
+            sa.Column('added_at', sa.DateTime(), nullable=False),
+        )
+
+
+def downgrade():
+    op.drop_table('cart_line')
+    op.drop_index('ix_cart_updated_at', table_name='cart')
+    op.drop_table('cart')
@@ -0,0 +1,36 @@
+"""Stored customer balance
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+
+Adds customer.balance, kept up to date by the sale and payment routes, and
+fills it from the existing sales and payments (the same figure as
+`flask rebuild-balances`).
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('customer')}
+    if 'balance' in columns:
+        return
+    op.add_column('customer', sa.Column('balance', sa.Float(), server_default='0'))
+    op.execute(
+        "UPDATE customer SET balance = "
+        "COALESCE((SELECT SUM(due_amount) FROM sale WHERE sale.customer_id = customer.id), 0) - "
+        "COALESCE((SELECT SUM(amount) FROM payment WHERE payment.customer_id = customer.id), 0)"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('customer') as batch_op:
+        batch_op.drop_column('balance')
@@ -0,0 +1,42 @@
+"""Unique bill numbers and the per-day bill sequence
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18
+
+uq_sale_bill_number is a unique index rather than a table constraint, so
+SQLite can add it without rebuilding the sale table. Duplicate bill numbers
+have to be fixed by hand before it can be created.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    if 'uq_sale_bill_number' not in {index['name'] for index in inspector.get_indexes('sale')}:
+        duplicates = conn.execute(sa.text(
+            'SELECT bill_number FROM sale GROUP BY bill_number HAVING COUNT(*) > 1'
+        )).scalars().all()
+        if duplicates:
+            raise RuntimeError(f"Duplicate bill numbers, cannot add uq_sale_bill_number: {', '.join(duplicates)}")
+        op.create_index('uq_sale_bill_number', 'sale', ['bill_number'], unique=True)
+    if 'bill_sequence' not in inspector.get_table_names():
+        op.create_table(
+            'bill_sequence',
+            sa.Column('day', sa.String(length=8), primary_key=True),
+            sa.Column('last_value', sa.Integer(), nullable=False),
+        )
+
+
+def downgrade():
+    op.drop_table('bill_sequence')
+    op.drop_index('uq_sale_bill_number', table_name='sale')
@@ -0,0 +1,42 @@
+"""Daily sales rollup
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18
+
+Creates daily_sales_summary and, while it is empty, fills it from the sales
+(the same rows as `flask rebuild-daily-summary`).
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+SUMMARY_FIELDS = ('total_amount', 'received_amount', 'due_amount', 'total_profit',
+                  'cash_amount', 'online_amount')
+
+
+def upgrade():
+    conn = op.get_bind()
+    if 'daily_sales_summary' not in sa.inspect(conn).get_table_names():
+        op.create_table(
+            'daily_sales_summary',
+            sa.Column('sale_date', sa.Date(), primary_key=True),
+            sa.Column('bill_count', sa.Integer(), nullable=False),
+            *[sa.Column(field, sa.Float(), nullable=False) for field in SUMMARY_FIELDS],
+        )
+    if conn.execute(sa.text('SELECT 1 FROM daily_sales_summary LIMIT 1')).first() is None:
+        sums = ', '.join(f'COALESCE(SUM({field}), 0.0)' for field in SUMMARY_FIELDS)
+        op.execute(
+            f"INSERT INTO daily_sales_summary (sale_date, bill_count, {', '.join(SUMMARY_FIELDS)}) "
+            f"SELECT sale_date, COUNT(id), {sums} FROM sale GROUP BY sale_date"
+        )
+
+
+def downgrade():
+    op.drop_table('daily_sales_summary')
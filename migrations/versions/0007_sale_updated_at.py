@@ -0,0 +1,29 @@
+"""Sale modification time
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18
+
+Adds sale.updated_at, set on every change to a sale. Sales made before it
+keep NULL until they are next edited.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('sale')}
+    if 'updated_at' not in columns:
+        op.add_column('sale', sa.Column('updated_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('sale') as batch_op:
+        batch_op.drop_column('updated_at')
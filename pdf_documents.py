@@ -0,0 +1,355 @@
+"""PDF rendering for invoices and customer statements with reportlab.
+
+The functions here take plain dicts (see sale_invoice_data and
+customer_statement_data in app.py), not ORM objects, so they can run outside
+a request or in another process. Fonts, the logo and the static parts of the
+page are prepared once per process and reused for every document.
+"""
+import io
+import multiprocessing
+import os
+import queue
+import tempfile
+import zipfile
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from functools import lru_cache
+
+from pypdf import PdfWriter
+from reportlab.graphics import renderPDF
+from reportlab.graphics.barcode import qr
+from reportlab.graphics.shapes import Drawing, Line, String
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import mm
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+PAGE_WIDTH, PAGE_HEIGHT = A4
+MARGIN = 15 * mm
+HEADER_HEIGHT = 28 * mm
+FOOTER_HEIGHT = 18 * mm
+ROW_HEIGHT = 6 * mm
+
+# Item table columns: (title, x position, alignment)
+ITEM_COLUMNS = (
+    ('Item Name', MARGIN + 2 * mm, 'left'),
+    ('Qty', MARGIN + 100 * mm, 'right'),
+    ('Unit', MARGIN + 104 * mm, 'left'),
+    ('Unit Price', MARGIN + 145 * mm, 'right'),
+    ('Total', PAGE_WIDTH - MARGIN - 2 * mm, 'right'),
+)
+
+# Statement table columns, same layout
+STATEMENT_COLUMNS = (
+    ('Date', MARGIN + 2 * mm, 'left'),
+    ('Description', MARGIN + 25 * mm, 'left'),
+    ('Amount', MARGIN + 125 * mm, 'right'),
+    ('Payment', MARGIN + 153 * mm, 'right'),
+    ('Balance', PAGE_WIDTH - MARGIN - 2 * mm, 'right'),
+)
+
+DOCUMENT_TITLES = {'invoice': 'INVOICE', 'statement': 'STATEMENT'}
+
+Resources = namedtuple('Resources', 'font bold currency logo headers footers table_headers')
+
+
+@lru_cache(maxsize=None)
+def page_resources(shop_name, logo_path=None, font_path=None):
+    """Fonts, logo and static page drawings, built once per process."""
+    font, bold, currency = 'Helvetica', 'Helvetica-Bold', 'Rs. '
+    if font_path and os.path.exists(font_path):
+        # A Unicode TTF can print the rupee sign
+        pdfmetrics.registerFont(TTFont('InvoiceFont', font_path))
+        font = bold = 'InvoiceFont'
+        currency = '₹'
+
+    logo = ImageReader(logo_path) if logo_path and os.path.exists(logo_path) else None
+    text_x = MARGIN + (22 * mm if logo else 0)
+
+    headers, footers, table_headers = {}, {}, {}
+    for kind, title in DOCUMENT_TITLES.items():
+        header = Drawing(PAGE_WIDTH, HEADER_HEIGHT)
+        header.add(String(text_x, 14 * mm, shop_name, fontName=bold, fontSize=15))
+        header.add(String(PAGE_WIDTH - MARGIN, 14 * mm, title, fontName=bold,
+                          fontSize=14, textAnchor='end'))
+        header.add(Line(MARGIN, 2 * mm, PAGE_WIDTH - MARGIN, 2 * mm, strokeWidth=0.8))
+        headers[kind] = header
+
+        footer = Drawing(PAGE_WIDTH, FOOTER_HEIGHT)
+        footer.add(Line(MARGIN, 14 * mm, PAGE_WIDTH - MARGIN, 14 * mm, strokeWidth=0.5))
+        footer.add(String(PAGE_WIDTH / 2, 9 * mm, 'Thank you for your business!',
+                          fontName=font, fontSize=9, textAnchor='middle'))
+        footer.add(String(PAGE_WIDTH / 2, 5 * mm, f'This is a computer generated {kind}',
+                          fontName=font, fontSize=7, textAnchor='middle', fillColor=colors.grey))
+        footers[kind] = footer
+
+    for kind, columns in (('invoice', ITEM_COLUMNS), ('statement', STATEMENT_COLUMNS)):
+        table_header = Drawing(PAGE_WIDTH, ROW_HEIGHT)
+        table_header.add(Line(MARGIN, 0, PAGE_WIDTH - MARGIN, 0, strokeWidth=0.5))
+        for title, x, align in columns:
+            anchor = 'end' if align == 'right' else 'start'
+            table_header.add(String(x, 1.8 * mm, title, fontName=bold, fontSize=9, textAnchor=anchor))
+        table_headers[kind] = table_header
+
+    return Resources(font, bold, currency, logo, headers, footers, table_headers)
+
+
+def _money(resources, amount):
+    return f'{resources.currency}{amount:.2f}'
+
+
+def _draw_frame(pdf, resources, page_number, kind='invoice'):
+    # Header, footer and page number; returns the y where content starts
+    renderPDF.draw(resources.headers[kind], pdf, 0, PAGE_HEIGHT - MARGIN - HEADER_HEIGHT)
+    if resources.logo:
+        pdf.drawImage(resources.logo, MARGIN, PAGE_HEIGHT - MARGIN - HEADER_HEIGHT + 5 * mm,
+                      18 * mm, 18 * mm, preserveAspectRatio=True, mask='auto')
+    renderPDF.draw(resources.footers[kind], pdf, 0, MARGIN - 5 * mm)
+    pdf.setFont(resources.font, 7)
+    pdf.drawRightString(PAGE_WIDTH - MARGIN, MARGIN - 3 * mm, f'Page {page_number}')
+    return PAGE_HEIGHT - MARGIN - HEADER_HEIGHT - 4 * mm
+
+
+def _draw_qr(pdf, value, x, y, size):
+    widget = qr.QrCodeWidget(value)
+    x1, y1, x2, y2 = widget.getBounds()
+    drawing = Drawing(size, size, transform=[size / (x2 - x1), 0, 0, size / (y2 - y1), 0, 0])
+    drawing.add(widget)
+    renderPDF.draw(drawing, pdf, x, y)
+
+
+def draw_invoice(pdf, invoice, resources):
+    """Draw one invoice onto an open canvas, starting on a new page."""
+    page = 1
+    y = _draw_frame(pdf, resources, page)
+
+    # Bill details with a QR code of the bill number
+    qr_size = 24 * mm
+    _draw_qr(pdf, invoice['bill_number'], PAGE_WIDTH - MARGIN - qr_size, y - qr_size, qr_size)
+    pdf.setFont(resources.bold, 10)
+    details = [
+        ('Bill No:', invoice['bill_number']),
+        ('Date:', invoice['sale_date']),
+        ('Time:', invoice['sale_time']),
+    ]
+    if invoice.get('customer'):
+        details.append(('Customer:', invoice['customer']))
+    for label, value in details:
+        y -= 5 * mm
+        pdf.setFont(resources.bold, 10)
+        pdf.drawString(MARGIN, y, label)
+        pdf.setFont(resources.font, 10)
+        pdf.drawString(MARGIN + 22 * mm, y, str(value))
+    y = min(y, PAGE_HEIGHT - MARGIN - HEADER_HEIGHT - 4 * mm - qr_size) - 8 * mm
+
+    # Items, continuing on new pages as needed
+    renderPDF.draw(resources.table_headers['invoice'], pdf, 0, y)
+    content_bottom = MARGIN + FOOTER_HEIGHT
+    for name, quantity, unit, price, total in invoice['items']:
+        y -= ROW_HEIGHT
+        if y < content_bottom:
+            pdf.showPage()
+            page += 1
+            y = _draw_frame(pdf, resources, page) - ROW_HEIGHT
+            renderPDF.draw(resources.table_headers['invoice'], pdf, 0, y)
+            y -= ROW_HEIGHT
+        pdf.setFont(resources.font, 9)
+        _draw_row(pdf, ITEM_COLUMNS, (
+            name[:60], f'{quantity:.2f}', unit, _money(resources, price), _money(resources, total)
+        ), y)
+    pdf.setLineWidth(0.5)
+    pdf.line(MARGIN, y, PAGE_WIDTH - MARGIN, y)
+
+    # Payment summary
+    due = invoice['due']
+    summary = [
+        ('Subtotal:', _money(resources, invoice['total'])),
+        ('Amount Paid:', _money(resources, invoice['received'])),
+        ('Balance Due:' if due > 0 else 'Change:',
+         _money(resources, due if due > 0 else invoice['received'] - invoice['total'])),
+        ('Payment Method:', invoice.get('payment_method') or ''),
+    ]
+    if y - len(summary) * ROW_HEIGHT - 4 * mm < content_bottom:
+        pdf.showPage()
+        page += 1
+        y = _draw_frame(pdf, resources, page)
+    y -= 4 * mm
+    for label, value in summary:
+        y -= ROW_HEIGHT
+        pdf.setFont(resources.bold, 10)
+        pdf.drawString(PAGE_WIDTH - MARGIN - 70 * mm, y, label)
+        pdf.setFont(resources.font, 10)
+        pdf.drawRightString(PAGE_WIDTH - MARGIN - 2 * mm, y, value)
+
+    pdf.showPage()
+
+
+def _draw_row(pdf, columns, values, y):
+    for (title, x, align), value in zip(columns, values):
+        if align == 'right':
+            pdf.drawRightString(x, y + 1.8 * mm, value)
+        else:
+            pdf.drawString(x, y + 1.8 * mm, value)
+
+
+def draw_statement(pdf, statement, resources):
+    """Draw one customer ledger statement onto an open canvas."""
+    page = 1
+    y = _draw_frame(pdf, resources, page, 'statement')
+
+    details = [
+        ('Customer:', statement['customer']),
+        ('Mobile:', statement.get('mobile') or '-'),
+        ('Period:', f"{statement['start_date']} to {statement['end_date']}"),
+        ('Opening:', _money(resources, statement['opening_balance'])),
+    ]
+    for label, value in details:
+        y -= 5 * mm
+        pdf.setFont(resources.bold, 10)
+        pdf.drawString(MARGIN, y, label)
+        pdf.setFont(resources.font, 10)
+        pdf.drawString(MARGIN + 22 * mm, y, str(value))
+    y -= 8 * mm
+
+    renderPDF.draw(resources.table_headers['statement'], pdf, 0, y)
+    content_bottom = MARGIN + FOOTER_HEIGHT
+    for day, description, amount, payment, balance in statement['entries']:
+        y -= ROW_HEIGHT
+        if y < content_bottom:
+            pdf.showPage()
+            page += 1
+            y = _draw_frame(pdf, resources, page, 'statement') - ROW_HEIGHT
+            renderPDF.draw(resources.table_headers['statement'], pdf, 0, y)
+            y -= ROW_HEIGHT
+        pdf.setFont(resources.font, 9)
+        _draw_row(pdf, STATEMENT_COLUMNS, (
+            day, description[:55],
+            _money(resources, amount) if amount else '-',
+            _money(resources, payment) if payment else '-',
+            _money(resources, balance)
+        ), y)
+    pdf.setLineWidth(0.5)
+    pdf.line(MARGIN, y, PAGE_WIDTH - MARGIN, y)
+
+    if y - 2 * ROW_HEIGHT < content_bottom:
+        pdf.showPage()
+        page += 1
+        y = _draw_frame(pdf, resources, page, 'statement')
+    y -= ROW_HEIGHT + 2 * mm
+    closing = statement['closing_balance']
+    pdf.setFont(resources.bold, 10)
+    pdf.drawString(PAGE_WIDTH - MARGIN - 70 * mm, y, 'Balance Due:' if closing >= 0 else 'Advance:')
+    pdf.drawRightString(PAGE_WIDTH - MARGIN - 2 * mm, y, _money(resources, abs(closing)))
+
+    pdf.showPage()
+
+
+DRAWERS = {'invoice': draw_invoice, 'statement': draw_statement}
+
+
+def render_invoice(invoice, resources):
+    """Render a single invoice and return the PDF bytes."""
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=A4, pageCompression=1)
+    pdf.setTitle(f"Invoice {invoice['bill_number']}")
+    draw_invoice(pdf, invoice, resources)
+    pdf.save()
+    return buffer.getvalue()
+
+
+# Batch rendering
+#
+# Documents are (kind, name, data) tuples where kind is a DOCUMENT_TITLES key.
+# Chunks of them are drawn in worker processes; each worker builds its page
+# resources once and keeps them for every chunk it handles.
+
+def render_chunk(documents, resource_args, path=None, finished=None):
+    """Worker entry point. With a path the chunk is drawn as one PDF written
+    there, otherwise a list of (name, pdf_bytes) pairs is returned.
+    finished, when given, is a queue that gets a 1 for every document drawn."""
+    resources = page_resources(*resource_args)
+    if path:
+        pdf = canvas.Canvas(path, pagesize=A4, pageCompression=1)
+        for kind, name, data in documents:
+            DRAWERS[kind](pdf, data, resources)
+            if finished is not None:
+                finished.put(1)
+        pdf.save()
+        return path
+
+    rendered = []
+    for kind, name, data in documents:
+        buffer = io.BytesIO()
+        pdf = canvas.Canvas(buffer, pagesize=A4, pageCompression=1)
+        pdf.setTitle(name)
+        DRAWERS[kind](pdf, data, resources)
+        pdf.save()
+        rendered.append((name, buffer.getvalue()))
+        if finished is not None:
+            finished.put(1)
+    return rendered
+
+
+def _completed(futures, finished, total, progress):
+    # Like as_completed(), also passing the per-document counts the workers
+    # put on `finished` to progress(done, total) while they run
+    done = 0
+    pending = set(futures)
+    while pending:
+        completed, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+        reported = done
+        while True:
+            try:
+                done += finished.get_nowait()
+            except queue.Empty:
+                break
+        if progress and done != reported:
+            progress(done, total)
+        yield from completed
+
+
+def render_batch(documents, output_path, resource_args, merged=False, workers=None,
+                 chunk_size=25, progress=None):
+    """Render documents to a ZIP of PDFs, or to one merged PDF when merged.
+
+    Chunks of documents are drawn in parallel on a process pool. For a merged
+    PDF each chunk is written to a temporary file next to output_path and the
+    files are joined in order with pypdf. progress(done, total) is called as
+    documents finish. Workers are spawned, not forked, so they never inherit
+    the caller's threads or database connections.
+    """
+    total = len(documents)
+    tmp_path = output_path + '.part'
+    context = multiprocessing.get_context('spawn')
+    chunks = [documents[i:i + chunk_size] for i in range(0, total, chunk_size)]
+
+    if merged:
+        with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(output_path))) as chunk_dir, \
+                context.Manager() as manager, \
+                ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            finished = manager.Queue()
+            paths = [os.path.join(chunk_dir, f'{i:06d}.pdf') for i in range(len(chunks))]
+            futures = [pool.submit(render_chunk, chunk, resource_args, path, finished)
+                       for chunk, path in zip(chunks, paths)]
+            for future in _completed(futures, finished, total, progress):
+                future.result()
+            writer = PdfWriter()
+            for path in paths:
+                writer.append(path)
+            with open(tmp_path, 'wb') as f:
+                writer.write(f)
+        os.replace(tmp_path, output_path)
+        return
+
+    with context.Manager() as manager, \
+            ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool, \
+            zipfile.ZipFile(tmp_path, 'w', compression=zipfile.ZIP_STORED) as archive:
+        finished = manager.Queue()
+        futures = [pool.submit(render_chunk, chunk, resource_args, None, finished) for chunk in chunks]
+        for future in _completed(futures, finished, total, progress):
+            for name, pdf_bytes in future.result():
+                archive.writestr(f'{name}.pdf', pdf_bytes)
+    os.replace(tmp_path, output_path)
@@ -0,0 +1,91 @@
+"""Per-request SQL statement counting and N+1 detection.
+
+When app.config['SQL_AUDIT'] is on, every statement a request executes is
+recorded with the place that issued it: the template line for statements
+triggered while rendering (lazy-loaded relationships), otherwise the app
+code line. After the request the same SELECT issued repeatedly from one
+place, i.e. differing only in its parameters, is logged as an N+1
+pattern. Requests over SQL_QUERY_BUDGET (or a view's @query_budget)
+are logged too, or fail with QueryBudgetExceeded when SQL_AUDIT_RAISE is
+set, which is how tests can pin a page to a fixed number of queries.
+"""
+import os
+import sys
+from collections import Counter
+from functools import wraps
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+# Repeats of one statement from one place before it is reported
+N_PLUS_ONE_THRESHOLD = 3
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def query_budget(limit):
+    """Per-view statement budget, overriding SQL_QUERY_BUDGET."""
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if has_request_context():
+                g.sql_budget = limit
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
+
+
+def _caller(app_root):
+    # The innermost template frame, else the innermost frame of app code
+    frame = sys._getframe(2)
+    code_line = None
+    while frame is not None:
+        template = frame.f_globals.get('__jinja_template__')
+        if template is not None:
+            return f'{template.name}:{template.get_corresponding_lineno(frame.f_lineno)}'
+        filename = frame.f_code.co_filename
+        if code_line is None and filename.startswith(app_root) and 'site-packages' not in filename \
+                and filename != __file__:
+            code_line = f'{os.path.relpath(filename, app_root)}:{frame.f_lineno}'
+        frame = frame.f_back
+    return code_line or '?'
+
+
+def _record(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'sql_statements' in g:
+        g.sql_statements.append((statement, _caller(g.sql_app_root)))
+
+
+def init_query_audit(app, db):
+    if not app.config.get('SQL_AUDIT'):
+        return
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', _record)
+
+    @app.before_request
+    def start_sql_audit():
+        g.sql_statements = []
+        g.sql_app_root = app.root_path
+
+    @app.after_request
+    def finish_sql_audit(response):
+        statements = g.pop('sql_statements', None)
+        if statements is None:
+            return response
+        response.headers['X-SQL-Queries'] = str(len(statements))
+
+        for (statement, caller), count in Counter(statements).items():
+            if count >= N_PLUS_ONE_THRESHOLD and statement.lstrip()[:6].upper() == 'SELECT':
+                app.logger.warning('N+1 query on %s %s: %d x %s [%s]', request.method,
+                                   request.path, count, ' '.join(statement.split())[:200], caller)
+
+        budget = g.get('sql_budget', app.config.get('SQL_QUERY_BUDGET'))
+        if budget is not None and len(statements) > budget:
+            message = f'{request.method} {request.path} ran {len(statements)} SQL statements (budget {budget})'
+            if app.config.get('SQL_AUDIT_RAISE'):
+                raise QueryBudgetExceeded(message)
+            app.logger.warning(message)
+        return response
@@ -0,0 +1,185 @@
+"""Per-request timing, Prometheus metrics and JSON access logs.
+
+init_request_metrics() hooks the app and the SQLAlchemy engine so every
+request records its latency, SQL statement count and time, template render
+time and response size. The figures go into in-process histograms, served
+in the Prometheus text format by metrics_text(), and into one JSON line per
+request on the access logger.
+
+The registry is per process: under gunicorn each worker exposes its own
+counts, so scrape the workers separately or run a single worker for
+complete numbers. Streamed responses (exports) are timed up to the start
+of the body and have no size.
+"""
+import bisect
+import json
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+
+from flask import before_render_template, g, has_request_context, request, template_rendered
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+access_logger = logging.getLogger('stock_sale.access')
+
+
+def _labels(names, values):
+    return ','.join(f'{name}="{value}"' for name, value in zip(names, values))
+
+
+class Counter:
+    def __init__(self, name, help_text, label_names):
+        self.name, self.help_text, self.label_names = name, help_text, label_names
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, labels, amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        with self.lock:
+            for labels, value in sorted(self.values.items()):
+                lines.append(f'{self.name}{{{_labels(self.label_names, labels)}}} {value}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, label_names, buckets):
+        self.name, self.help_text, self.label_names = name, help_text, label_names
+        self.buckets = buckets
+        self.values = {}  # labels -> [per-bucket counts (+Inf last), sum, count]
+        self.lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self.lock:
+            counts = self.values.get(labels)
+            if counts is None:
+                counts = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            counts[0][bisect.bisect_left(self.buckets, value)] += 1
+            counts[1] += value
+            counts[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self.lock:
+            for labels, (buckets, total, count) in sorted(self.values.items()):
+                label_text = _labels(self.label_names, labels)
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + ('+Inf',), buckets):
+                    cumulative += bucket_count
+                    lines.append(f'{self.name}_bucket{{{label_text},le="{bound}"}} {cumulative}')
+                lines.append(f'{self.name}_sum{{{label_text}}} {total}')
+                lines.append(f'{self.name}_count{{{label_text}}} {count}')
+        return lines
+
+
+REQUESTS = Counter('http_requests_total', 'Requests handled.', ('endpoint', 'method', 'status'))
+LATENCY = Histogram('http_request_duration_seconds', 'Time to produce the response.',
+                    ('endpoint', 'method'), LATENCY_BUCKETS)
+RESPONSE_SIZE = Histogram('http_response_size_bytes', 'Response body size.', ('endpoint',), SIZE_BUCKETS)
+QUERY_COUNT = Histogram('db_queries_per_request', 'SQL statements run per request.',
+                        ('endpoint',), QUERY_COUNT_BUCKETS)
+QUERY_TIME = Histogram('db_query_seconds_per_request', 'Time spent in SQL per request.',
+                       ('endpoint',), LATENCY_BUCKETS)
+RENDER_TIME = Histogram('template_render_seconds', 'Template render time.', ('template',), LATENCY_BUCKETS)
+METRICS = (REQUESTS, LATENCY, RESPONSE_SIZE, QUERY_COUNT, QUERY_TIME, RENDER_TIME)
+
+
+def metrics_text():
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # The start time goes on the statement's own execution context, so a
+    # statement that raises (and never reaches after_cursor_execute) leaves
+    # nothing behind on the pooled connection
+    if has_request_context() and 'metrics_start' in g:
+        context._metrics_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, '_metrics_start', None)
+    if start is not None and has_request_context() and 'metrics_start' in g:
+        g.metrics_sql_time += time.perf_counter() - start
+        g.metrics_sql_count += 1
+
+
+def _before_render(sender, template, context, **extra):
+    if has_request_context() and 'metrics_start' in g:
+        g.metrics_render_start = time.perf_counter()
+
+
+def _rendered(sender, template, context, **extra):
+    if has_request_context() and 'metrics_render_start' in g:
+        elapsed = time.perf_counter() - g.pop('metrics_render_start')
+        g.metrics_render_time += elapsed
+        RENDER_TIME.observe((template.name or 'string',), elapsed)
+
+
+def init_request_metrics(app, db):
+    if not app.config.get('REQUEST_METRICS'):
+        return
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(db.engine, 'after_cursor_execute', _after_cursor_execute)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_rendered, app)
+
+    if app.config.get('ACCESS_LOG') and not access_logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        access_logger.addHandler(handler)
+        access_logger.setLevel(logging.INFO)
+        access_logger.propagate = False
+
+    @app.before_request
+    def start_request_metrics():
+        g.metrics_start = time.perf_counter()
+        g.metrics_sql_count = 0
+        g.metrics_sql_time = 0.0
+        g.metrics_render_time = 0.0
+
+    @app.after_request
+    def record_request_metrics(response):
+        start = g.pop('metrics_start', None)
+        if start is None:
+            return response
+        duration = time.perf_counter() - start
+        endpoint = request.endpoint or 'unmatched'
+        size = response.content_length
+        if size is None and not response.is_streamed:
+            size = response.calculate_content_length()
+
+        REQUESTS.inc((endpoint, request.method, response.status_code))
+        LATENCY.observe((endpoint, request.method), duration)
+        QUERY_COUNT.observe((endpoint,), g.metrics_sql_count)
+        QUERY_TIME.observe((endpoint,), g.metrics_sql_time)
+        if size is not None:
+            RESPONSE_SIZE.observe((endpoint,), size)
+
+        if app.config.get('ACCESS_LOG'):
+            access_logger.info(json.dumps({
+                'time': datetime.now(timezone.utc).isoformat(timespec='milliseconds'),
+                'method': request.method,
+                'path': request.path,
+                'endpoint': endpoint,
+                'status': response.status_code,
+                'duration_ms': round(duration * 1000, 2),
+                'sql_count': g.metrics_sql_count,
+                'sql_ms': round(g.metrics_sql_time * 1000, 2),
+                'render_ms': round(g.metrics_render_time * 1000, 2),
+                'bytes': size,
+                'remote_addr': request.remote_addr
+            }))
+        return response
@@ -0,0 +1,157 @@
+"""Opt-in profiling of single requests.
+
+A request carrying ?_profile=1 (or an X-Profile: 1 header; 'prof' and
+'html' also select the output) from a user that
+is_allowed() accepts runs under a profiler from before_request to
+after_request, which covers the view, its queries and template rendering.
+The result is written to the profile directory as a .prof file (cProfile,
+readable with pstats or snakeviz) or, when pyinstrument is installed and
+asked for with _profile=html, as an HTML flame view, together with a .json
+file describing the request. Only one request is profiled at a time;
+others asking meanwhile are served normally.
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from flask import g, request
+
+try:
+    from pyinstrument import Profiler as HtmlProfiler
+except ImportError:  # optional; cProfile output works without it
+    HtmlProfiler = None
+
+PROFILE_NAME = re.compile(r'^[0-9]{8}T[0-9]{6}-[0-9a-f]{8}\.(prof|html)$')
+
+_active = threading.Lock()
+
+
+def _requested():
+    kind = request.args.get('_profile') or request.headers.get('X-Profile')
+    return kind if kind in ('1', 'prof', 'html') else None
+
+
+def _start(kind):
+    if kind == 'html' and HtmlProfiler is not None:
+        profiler = HtmlProfiler()
+        profiler.start()
+        return 'html', profiler
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return 'prof', profiler
+
+
+def _stop(kind, profiler):
+    if kind == 'html':
+        profiler.stop()
+        return profiler.output_html().encode('utf-8')
+    profiler.disable()
+    return pstats.Stats(profiler)
+
+
+def _write(path, data):
+    tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+    if isinstance(data, pstats.Stats):
+        data.dump_stats(tmp_path)  # pstats only writes to a file name
+    else:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+    os.replace(tmp_path, path)
+
+
+def list_profiles(directory):
+    """Metadata of the stored profiles, newest first."""
+    profiles = []
+    if not os.path.isdir(directory):
+        return profiles
+    for entry in os.scandir(directory):
+        if entry.name.endswith('.json'):
+            try:
+                with open(entry.path) as f:
+                    profiles.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+    profiles.sort(key=lambda profile: profile['created'], reverse=True)
+    return profiles
+
+
+def prune_profiles(directory, max_files, max_bytes):
+    # Oldest profiles go first once either limit is passed
+    profiles = list_profiles(directory)
+    total_bytes = sum(profile['size'] for profile in profiles)
+    while profiles and (len(profiles) > max_files or total_bytes > max_bytes):
+        profile = profiles.pop()
+        for name in (profile['file'], profile['file'].rsplit('.', 1)[0] + '.json'):
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+        total_bytes -= profile['size']
+
+
+def stats_text(path, sort='cumulative', limit=60):
+    """Top of a .prof file as pstats prints it."""
+    output = io.StringIO()
+    stats = pstats.Stats(path, stream=output)
+    stats.strip_dirs().sort_stats(sort).print_stats(limit)
+    return output.getvalue()
+
+
+def init_request_profiler(app, directory, is_allowed):
+    @app.before_request
+    def start_profile():
+        kind = _requested()
+        if not kind or not app.config.get('PROFILING') or not is_allowed():
+            return
+        if not _active.acquire(blocking=False):
+            return
+        g.profile_kind, g.profiler = _start(kind)
+        g.profile_start = time.perf_counter()
+
+    @app.after_request
+    def finish_profile(response):
+        profiler = g.pop('profiler', None)
+        if profiler is None:
+            return response
+        try:
+            duration = time.perf_counter() - g.profile_start
+            data = _stop(g.profile_kind, profiler)
+
+            os.makedirs(directory, exist_ok=True)
+            created = datetime.now()
+            name = f"{created.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+            path = os.path.join(directory, f'{name}.{g.profile_kind}')
+            _write(path, data)
+            meta = {
+                'file': f'{name}.{g.profile_kind}',
+                'created': created.isoformat(timespec='milliseconds'),
+                'method': request.method,
+                'path': request.full_path.rstrip('?'),
+                'endpoint': request.endpoint,
+                'status': response.status_code,
+                'duration_ms': round(duration * 1000, 2),
+                'size': os.path.getsize(path)
+            }
+            _write(os.path.join(directory, f'{name}.json'), json.dumps(meta).encode('utf-8'))
+            prune_profiles(directory, app.config['PROFILE_MAX_FILES'], app.config['PROFILE_MAX_BYTES'])
+            response.headers['X-Profile-Id'] = meta['file']
+        finally:
+            _active.release()
+        return response
+
+    @app.teardown_request
+    def abandon_profile(exc):
+        # A request that failed before after_request still frees the profiler
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            try:
+                _stop(g.profile_kind, profiler)
+            finally:
+                _active.release()
@@ -37,17 +37,128 @@ document.addEventListener('DOMContentLoaded', function() {
         updateCartDisplay();
     }
 
-    // 1. Item Search
-    if (itemSearch) {
+    // 1. Item Search (items are fetched from the server as you type)
+    let searchTimer = null;
+    let searchRequest = 0;
+
+    function loadItems(query) {
+        const requestId = ++searchRequest;
+        fetch(`/api/items/search?q=${encodeURIComponent(query)}&limit=20`)
+            .then(response => response.json())
+            .then(data => {
+                // Ignore responses that arrive after a newer search
+                if (requestId === searchRequest && data.success) {
+                    renderItems(data.items);
+                }
+            })
+            .catch(error => console.error('Item search error:', error));
+    }
+
+    function renderItems(items) {
+        const tbody = itemsTable.querySelector('tbody');
+        tbody.innerHTML = '';
+
+        items.forEach(item => {
+            const row = document.createElement('tr');
+            row.innerHTML = `
+                <td></td><td></td><td></td><td></td><td></td>
+                <td>
+                    <div class="input-group">
+                        <input type="number" class="form-control item-quantity" value="1" min="1" style="width: 3px;">
+                        <button class="btn btn-primary btn-sm add-to-cart">Add</button>
+                    </div>
+                </td>
+            `;
+            // Names are user input, so set them as text rather than HTML
+            const cells = row.querySelectorAll('td');
+            cells[0].textContent = item.id;
+            cells[1].textContent = item.name;
+            cells[2].textContent = item.quantity;
+            cells[3].textContent = item.unit;
+            cells[4].textContent = item.sale_price.toFixed(2);
+            row.querySelector('.item-quantity').max = item.quantity;
+
+            const button = row.querySelector('.add-to-cart');
+            button.dataset.itemId = item.id;
+            button.dataset.itemName = item.name;
+            button.dataset.itemUnit = item.unit;
+            button.dataset.itemPrice = item.sale_price;
+            button.dataset.itemPurchasePrice = item.purchase_price;
+            tbody.appendChild(row);
+        });
+    }
+
+    if (itemSearch && itemsTable) {
         itemSearch.addEventListener('input', function() {
-            const searchTerm = this.value.toLowerCase();
-            const rows = itemsTable.querySelectorAll('tbody tr');
-            
-            rows.forEach(row => {
-                const itemName = row.querySelector('td:nth-child(2)').textContent.toLowerCase();
-                row.style.display = itemName.includes(searchTerm) ? '' : 'none';
-            });
+            const query = this.value.trim();
+            clearTimeout(searchTimer);
+            searchTimer = setTimeout(() => loadItems(query), 150);
+        });
+        loadItems('');
+    }
+
+    // 1b. Customer Picker (options are fetched a page at a time as you type)
+    const customerSearch = document.getElementById('customer-search');
+    let customerTimer = null;
+    let customerRequest = 0;
+    let customerQuery = '';
+    let customerCursor = null;
+    let selectedCustomer = customerSelect ? customerSelect.value : '';
+
+    function loadCustomers(query, cursor) {
+        const requestId = ++customerRequest;
+        let url = `/api/customers/lookup?q=${encodeURIComponent(query)}`;
+        if (cursor) {
+            url += `&cursor=${encodeURIComponent(cursor)}`;
+        }
+        fetch(url)
+            .then(response => response.json())
+            .then(data => {
+                if (requestId !== customerRequest || !data.success) return;
+
+                // A new search replaces the list; Walk-in and the current
+                // selection always stay
+                Array.from(customerSelect.options).forEach(option => {
+                    if (option.value === 'more' || (!cursor && option.value && option.value !== selectedCustomer)) {
+                        option.remove();
+                    }
+                });
+                data.customers.forEach(customer => {
+                    if (customerSelect.querySelector(`option[value="${customer.id}"]`)) return;
+                    const option = document.createElement('option');
+                    option.value = customer.id;
+                    option.textContent = `${customer.name} (${customer.mobile || ''})`;
+                    customerSelect.appendChild(option);
+                });
+
+                customerQuery = query;
+                customerCursor = data.next_cursor;
+                if (customerCursor) {
+                    const more = document.createElement('option');
+                    more.value = 'more';
+                    more.textContent = 'More customers...';
+                    customerSelect.appendChild(more);
+                }
+                customerSelect.value = selectedCustomer;
+            })
+            .catch(error => console.error('Customer lookup error:', error));
+    }
+
+    if (customerSelect && customerSearch) {
+        customerSearch.addEventListener('input', function() {
+            const query = this.value.trim();
+            clearTimeout(customerTimer);
+            customerTimer = setTimeout(() => loadCustomers(query, null), 200);
+        });
+        customerSelect.addEventListener('change', function() {
+            if (this.value === 'more') {
+                this.value = selectedCustomer;
+                loadCustomers(customerQuery, customerCursor);
+            } else {
+                selectedCustomer = this.value;
+            }
         });
+        loadCustomers('', null);
     }
 
     // 2. Add to Cart
@@ -395,6 +506,7 @@ document.addEventListener('DOMContentLoaded', function() {
                     option.textContent = `${data.customer.name} (${data.customer.mobile || ''})`;
                     customerSelect.appendChild(option);
                     customerSelect.value = data.customer.id;
+                    selectedCustomer = customerSelect.value;
 
                     // Close modal
                     const modalEl = document.getElementById("newCustomerModal");
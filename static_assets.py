@@ -0,0 +1,86 @@
+"""Build-free fingerprinting and precompression of static files.
+
+At startup every file under the static folder (except uploads) is hashed,
+and its URL gets the hash in the name: js/sales.js is linked as
+js/sales.3f2a9c01b7de.js. The content of such a URL can never change, so it
+is served with a one-year immutable Cache-Control. Text assets are also
+compressed once, with gzip and, when the brotli module is installed, brotli,
+into a cache directory keyed by the fingerprinted name.
+"""
+import gzip
+import hashlib
+import os
+from collections import namedtuple
+
+try:
+    import brotli
+except ImportError:  # optional; gzip alone still covers every browser
+    brotli = None
+
+FINGERPRINT_LENGTH = 12
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+COMPRESSIBLE = {'.css', '.js', '.json', '.map', '.svg', '.txt', '.html', '.ico'}
+
+# urls: {'js/sales.js': 'js/sales.<hash>.js'}
+# files: {'js/sales.<hash>.js': ('js/sales.js', {'br': path, 'gzip': path})}
+Manifest = namedtuple('Manifest', 'urls files')
+
+
+def _digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:FINGERPRINT_LENGTH]
+
+
+def _precompress(path, cache_path):
+    # Writes cache_path.gz / .br once (the name is content-addressed) and
+    # returns the encodings worth serving, i.e. those that came out smaller
+    with open(path, 'rb') as f:
+        data = f.read()
+    compressors = [('gzip', '.gz', lambda raw: gzip.compress(raw, 9, mtime=0))]
+    if brotli:
+        compressors.insert(0, ('br', '.br', lambda raw: brotli.compress(raw, quality=11)))
+
+    encodings = {}
+    for encoding, suffix, compress in compressors:
+        target = cache_path + suffix
+        if not os.path.exists(target):
+            compressed = compress(data)
+            if len(compressed) >= len(data):
+                continue
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            tmp_path = f'{target}.{os.getpid()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(compressed)
+            os.replace(tmp_path, target)
+        encodings[encoding] = target
+    return encodings
+
+
+def build_manifest(static_folder, cache_dir, exclude=('uploads',)):
+    urls, files = {}, {}
+    for root, dirs, names in os.walk(static_folder):
+        if root == static_folder:
+            dirs[:] = [name for name in dirs if name not in exclude]
+        for name in names:
+            path = os.path.join(root, name)
+            logical = os.path.relpath(path, static_folder).replace(os.sep, '/')
+            stem, ext = os.path.splitext(logical)
+            fingerprinted = f'{stem}.{_digest(path)}{ext}'
+
+            encodings = {}
+            if ext.lower() in COMPRESSIBLE:
+                encodings = _precompress(path, os.path.join(cache_dir, fingerprinted))
+            urls[logical] = fingerprinted
+            files[fingerprinted] = (logical, encodings)
+    return Manifest(urls, files)
+
+
+def pick_encoding(accept_encoding, encodings):
+    """The best precompressed encoding the client accepts, or None."""
+    for encoding in ('br', 'gzip'):
+        if encoding in encodings and accept_encoding[encoding]:
+            return encoding
+    return None
@@ -0,0 +1,67 @@
+import os
+from datetime import date
+
+os.environ['DATABASE_URL'] = 'sqlite://'
+os.environ['ACCESS_LOG'] = '0'
+
+import pytest
+
+from app import DailySalesSummary, Item, Sale, app, db, rebuild_daily_summary
+
+
+@pytest.fixture
+def client():
+    with app.app_context():
+        db.session.add(Item(name='Rice', quantity=100, unit='kg', purchase_price=40, sale_price=50,
+                            date_added=date.today()))
+        db.session.commit()
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = 1
+        session['username'] = 'admin'
+        session['role'] = 'admin'
+    yield client
+    with app.app_context():
+        for model in (DailySalesSummary, Sale, Item):
+            for row in model.query.all():
+                db.session.delete(row)
+        db.session.commit()
+
+
+def make_sale(client, quantity=2):
+    with app.app_context():
+        item = Item.query.filter_by(name='Rice').one()
+        line = {'item_id': item.id, 'unit': item.unit, 'quantity': quantity,
+                'purchase_price': item.purchase_price, 'sale_price': item.sale_price}
+    total = quantity * line['sale_price']
+    response = client.post('/new_sale', json={
+        'customer_id': None, 'payment_method': 'Cash',
+        'received_amount': total, 'cash_amount': total, 'items': [line]
+    })
+    assert response.get_json()['success']
+    return response.get_json()['sale_id']
+
+
+def test_deleting_the_last_sale_of_a_day_removes_its_rollup_row(client):
+    first, second = make_sale(client), make_sale(client, quantity=3)
+    with app.app_context():
+        assert db.session.get(DailySalesSummary, date.today()).bill_count == 2
+
+    client.post(f'/sales/{first}/delete')
+    with app.app_context():
+        assert db.session.get(DailySalesSummary, date.today()).bill_count == 1
+        assert rebuild_daily_summary(fix=False) == []
+
+    client.post(f'/sales/{second}/delete')
+    with app.app_context():
+        assert db.session.get(DailySalesSummary, date.today()) is None
+        assert rebuild_daily_summary(fix=False) == []
+
+
+def test_check_treats_an_all_zero_row_as_no_sales(client):
+    with app.app_context():
+        db.session.add(DailySalesSummary(sale_date=date(2026, 1, 1), bill_count=0, total_amount=0,
+                                         received_amount=0, due_amount=0, total_profit=0,
+                                         cash_amount=0, online_amount=0))
+        db.session.commit()
+        assert rebuild_daily_summary(fix=False) == []